@@ -0,0 +1,135 @@
+# Render + send throughput benchmark against a local headless WLED emulator
+#
+#   python bench.py                                   full matrix
+#   python bench.py --strips 6 --lengths 300 --fx chase rainbow --duration 2
+#
+# Every case renders and sends unthrottled for --duration seconds and reports
+# frames/sec, the time spent per stage and the packets/sec that reached the receiver.
+# copies counts frames encoded into fresh buffers because the loop still held the old ones.
+# Nodes are 127.0.0.1, 127.0.0.2, ... so they share one receiver bound to 0.0.0.0.
+import time
+import argparse
+from lights import Lights
+from network import UDPOutput
+from clock import now
+from fx import registry
+from fx.mono.effects import idleEffect
+from fx.mono.colors import rainbow
+from wled_emulator import HeadlessEmulator
+
+# values for the arguments fx functions have no default for
+ARG_VALUES = {"bpm": 120, "r": 255, "g": 80, "b": 0}
+
+def fx_args(info):
+    args = []
+    for name, default in info.params:
+        if default is not None:
+            args.append(default)
+        elif name == "start_time":
+            args.append(now())
+        else:
+            args.append(ARG_VALUES[name])
+    return args
+
+def apply_fx(lights, info):
+    '''
+    put every strip of lights on the fx; effects get a rainbow, colors get idleEffect
+    '''
+    args = fx_args(info)
+    if info.kind == "poly":
+        for i in range(lights.num_strips):
+            lights.setStrip(i, colorFunc=rainbow, color_args=[])
+        info.func(lights, *args)
+    elif info.kind == "mono":
+        for i in range(lights.num_strips):
+            lights.setStrip(i, info.func, args, rainbow, [])
+    else:
+        for i in range(lights.num_strips):
+            lights.setStrip(i, idleEffect, [], info.func, args)
+
+def split_strips(num_strips, nodes):
+    '''
+    {node ip: [strip indexes]} with the strips divided as evenly as possible
+    '''
+    per_node = -(-num_strips // nodes)
+    return {f"127.0.0.{n + 1}": list(range(n * per_node, min((n + 1) * per_node, num_strips)))
+            for n in range(nodes) if n * per_node < num_strips}
+
+def run_case(receiver, info, num_strips, strip_length, nodes, duration):
+    lights = Lights(strip_length, num_strips, wled_addr=split_strips(num_strips, nodes), port=receiver.controllers[0].port)
+    output = UDPOutput.fromLights(lights)
+    apply_fx(lights, info)
+
+    render = encode = submit = 0.0
+    frames = 0
+    received = receiver.packets
+    start = time.perf_counter()
+    end = start + duration
+    while True:
+        t0 = time.perf_counter()
+        if t0 >= end:
+            break
+        t = now()
+        lights.update(t)
+        t1 = time.perf_counter()
+        batch = output.encode(t)
+        t2 = time.perf_counter()
+        output.submit(batch, t)
+        t3 = time.perf_counter()
+        render += t1 - t0
+        encode += t2 - t1
+        submit += t3 - t2
+        frames += 1
+    elapsed = time.perf_counter() - start
+
+    time.sleep(0.05) # let the network loop and receiver drain
+    stats = output.stats().values()
+    output.close()
+    return {
+        "fx": info.name, "strips": num_strips, "length": strip_length, "nodes": len(lights.wled_addr),
+        "fps": frames / elapsed,
+        "render_ms": render / frames * 1000, "encode_ms": encode / frames * 1000, "submit_ms": submit / frames * 1000,
+        "send_ms": max(st["latency_avg"] for st in stats) * 1000,
+        "sent_pps": sum(st["packets"] for st in stats) / elapsed,
+        "recv_pps": (receiver.packets - received) / elapsed,
+        "dropped": sum(st["dropped"] for st in stats),
+        "copies": sum(st["copies"] for st in stats),
+    }
+
+# (result key, column width, number format)
+COLUMNS = [("fx", -14, ""), ("strips", 6, ""), ("length", 6, ""), ("nodes", 5, ""), ("fps", 8, ".0f"),
+           ("render_ms", 9, ".3f"), ("encode_ms", 9, ".3f"), ("submit_ms", 9, ".3f"), ("send_ms", 7, ".3f"),
+           ("sent_pps", 9, ".0f"), ("recv_pps", 9, ".0f"), ("dropped", 7, ""), ("copies", 6, "")]
+
+def format_row(values):
+    return " ".join(f"{value:{'<' if width < 0 else '>'}{abs(width)}{spec}}"
+                    for value, (_, width, spec) in zip(values, COLUMNS))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Lights.update, encoding and sending")
+    parser.add_argument("--strips", type=int, nargs="+", default=[6, 24], help="strip counts")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[80, 300], help="strip lengths")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 3], help="WLED node counts")
+    parser.add_argument("--fx", nargs="+", help="effects / colors to run (default: every registered one)")
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds per case")
+    parser.add_argument("--port", type=int, default=0, help="receiver port (default: any free port)")
+    args = parser.parse_args()
+
+    fx = [registry.get(name) for name in args.fx] if args.fx else registry.entries()
+    # one controller big enough for every node's frame, DNRGB chunks land at their start index
+    receiver = HeadlessEmulator([args.port], num_strips=max(args.strips), strip_length=max(args.lengths))
+    print(" ".join(f"{name:{'<' if width < 0 else '>'}{abs(width)}}" for name, width, _ in COLUMNS))
+    try:
+        for num_strips in args.strips:
+            for strip_length in args.lengths:
+                for nodes in args.nodes:
+                    for info in fx:
+                        result = run_case(receiver, info, num_strips, strip_length, nodes, args.duration)
+                        print(format_row([result[name] for name, _, _ in COLUMNS]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+# Shared frame clock
+import time
+
+# monotonic clock anchored to wall time at startup, so frame timestamps never jump
+# with NTP/DST changes but stay comparable to time.time() values (e.g. pulse start_time)
+_offset = time.time() - time.monotonic()
+
+def now():
+    return time.monotonic() + _offset
+
+def toMonotonic(t):
+    '''
+    convert a frame timestamp back to time.monotonic(), the clock asyncio loops schedule on
+    '''
+    return t - _offset
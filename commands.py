@@ -0,0 +1,326 @@
+# Button commands compiled once when a config is loaded
+#
+# A button is [color, active, http, udp, func]. udp is a versioned command object
+#
+#   {"version": 1, "strips": [
+#       {"index": 0, "effect": "bounce", "effect_args": ["bpm", 8],
+#        "color": "solid", "color_args": [255, 0, 0], "misc": null}, ...]}
+#
+# Args are numbers or expression strings ("bpm", "bpm * 10", "now"), misc
+# and func are expression strings ("polySwipe(lights, bpm/3)"), only they can use lights. Expressions are
+# compiled into plain functions of the press-time namespace by a small AST walker,
+# nothing is passed to eval. They can only use arithmetic, the BUTTON_NAMES and the
+# registered fx, and only call BUTTON_CALLS and fx. Older configs store udp as a Python source string,
+# legacyToStructured() converts those (run this file to convert configs in place).
+import ast
+import json
+import operator
+import sys
+from fx import registry
+from network import buildMessage
+
+COMMAND_VERSION = 1
+
+# names the press-time namespace provides besides the registered fx
+#   bpm      current tempo
+#   now      press time (clock.now())
+#   lights   the Lights object, for misc / func
+#   add_to_bpm(amount)
+BUTTON_NAMES = ("bpm", "now", "lights", "add_to_bpm")
+ARG_NAMES = ("bpm", "now", "add_to_bpm") # strip args are evaluated at press time, before the engine has lights
+BUTTON_CALLS = ("add_to_bpm",)
+
+# +=====+ Expressions +=====+ #
+
+_BINOPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+_UNARYOPS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+def _isFx(name):
+    try:
+        registry.get(name)
+    except KeyError:
+        return False
+    return True
+
+def _isLegacyTime(node):
+    # time.time() from older configs, the press time
+    return (isinstance(node, ast.Call) and not node.args and not node.keywords
+            and isinstance(node.func, ast.Attribute) and node.func.attr == "time"
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == "time")
+
+def _compileNode(node, names):
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda ns: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name not in names and not _isFx(name):
+            raise ValueError(f"unknown name {name!r}")
+        return lambda ns: ns[name]
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        op, left, right = _BINOPS[type(node.op)], _compileNode(node.left, names), _compileNode(node.right, names)
+        return lambda ns: op(left(ns), right(ns))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARYOPS:
+        op, operand = _UNARYOPS[type(node.op)], _compileNode(node.operand, names)
+        return lambda ns: op(operand(ns))
+    if _isLegacyTime(node):
+        return lambda ns: ns["now"]
+    if isinstance(node, ast.Call) and not node.keywords:
+        if not (isinstance(node.func, ast.Name) and (node.func.id in BUTTON_CALLS or _isFx(node.func.id))):
+            raise ValueError(f"call not allowed: {ast.unparse(node.func)}")
+        name, args = node.func.id, [_compileNode(a, names) for a in node.args]
+        return lambda ns: ns[name](*[a(ns) for a in args])
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_compileNode(e, names) for e in node.elts]
+        return lambda ns: [i(ns) for i in items]
+    raise ValueError(f"unsupported expression: {ast.unparse(node)}")
+
+def compileExpr(source, names=BUTTON_NAMES):
+    '''
+    expression string -> function(ns) evaluating it against the press-time namespace, using only names and the fx
+    '''
+    return _compileNode(ast.parse(source, mode="eval").body, names)
+
+# +=====+ Compiled commands +=====+ #
+
+def _compileFunc(name, kind):
+    if name is None:
+        return None
+    try:
+        return registry.get(name, kind).func
+    except KeyError:
+        raise ValueError(f"unknown {'effect' if kind == 'mono' else kind} {name!r}") from None
+
+def _compileArgs(args):
+    # all-number args are built once, otherwise every arg becomes a function of the namespace
+    if args is None:
+        return None
+    if not isinstance(args, list):
+        raise ValueError(f"args must be a list, got {args!r}")
+    if not any(isinstance(a, str) for a in args):
+        return tuple(args)
+    return tuple(compileExpr(a, ARG_NAMES) if isinstance(a, str) else (lambda ns, a=a: a) for a in args)
+
+class StripCommand:
+    def __init__(self, index, effectFunc, effect_args, colorFunc, color_args, misc=None):
+        self.index = index
+        self.effectFunc = effectFunc
+        self.effect_args = effect_args
+        self.colorFunc = colorFunc
+        self.color_args = color_args
+        self.misc = misc
+
+    def resolve(self, ns):
+        '''
+        Lights.setStrip arguments for a press, evaluating press-time args in namespace ns
+        '''
+        ea = self.effect_args
+        if ea and callable(ea[0]):
+            ea = tuple(a(ns) for a in ea)
+        ca = self.color_args
+        if ca and callable(ca[0]):
+            ca = tuple(a(ns) for a in ca)
+        return self.index, self.effectFunc, ea, self.colorFunc, ca
+
+class ButtonCommand:
+    def __init__(self, http=None, strips=(), func=None):
+        self.http = http
+        self.strips = strips
+        self.func = func
+
+def compileUdp(udp):
+    '''
+    structured (or legacy string) udp command -> tuple of StripCommands, raises ValueError on bad configs
+    '''
+    if isinstance(udp, str):
+        udp = legacyToStructured(udp)
+    if not isinstance(udp, dict) or udp.get("version") != COMMAND_VERSION:
+        raise ValueError(f"unsupported udp command (expected version {COMMAND_VERSION}): {udp!r}")
+
+    strips = []
+    for s in udp.get("strips", []):
+        misc = s.get("misc")
+        strips.append(StripCommand(
+            int(s["index"]),
+            _compileFunc(s.get("effect"), "mono"), _compileArgs(s.get("effect_args")),
+            _compileFunc(s.get("color"), "color"), _compileArgs(s.get("color_args")),
+            compileExpr(misc) if misc else None,
+        ))
+    return tuple(strips)
+
+def compileButton(button):
+    '''
+    [color, active, http, udp, func] -> ButtonCommand, http is parsed into its WLED message here
+    '''
+    _, _, http_val, udp_val, func = button
+    return ButtonCommand(
+        buildMessage(http_val) if http_val else None,
+        compileUdp(udp_val) if udp_val is not None else (),
+        compileExpr(func) if func else None,
+    )
+
+def compileGrid(grid):
+    '''
+    compile every button of a 9x9 grid, returns (commands, errors).
+    buttons that fail to compile get an empty ButtonCommand and an entry in errors
+    '''
+    commands = [[None] * len(row) for row in grid]
+    errors = []
+    for r, row in enumerate(grid):
+        for c, button in enumerate(row):
+            try:
+                commands[r][c] = compileButton(button)
+            except (ValueError, SyntaxError, TypeError, KeyError) as e:
+                errors.append(((r, c), e))
+                commands[r][c] = ButtonCommand()
+    return commands, errors
+
+def _default_grid():
+    return [[[0, True, None, None, None] for _ in range(9)] for _ in range(9)]
+
+class ButtonGrid:
+    '''
+    9x9 button config plus its compiled commands, kept in sync. The Launchpad is one,
+    a headless daemon without a pad uses a plain ButtonGrid for remote presses.
+    '''
+    def __init__(self, grid=None):
+        self.grid = grid if grid is not None else _default_grid()
+        self.commands, _ = compileGrid(self.grid)
+        self.file_path = None
+
+    def load_grid_from_file(self, file_path):
+        try:
+            with open(file_path, 'r') as file:
+                data = json.load(file)
+                self.grid = data
+        except FileNotFoundError:
+            print(f"File not found: {file_path}")
+            return
+        except json.JSONDecodeError:
+            print(f"Invalid JSON data in file: {file_path}")
+            return
+        self.file_path = file_path
+        self.commands, errors = compileGrid(self.grid)
+        for (row, col), e in errors:
+            print(f"Button {row}, {col} in {file_path} not loaded: {e}")
+
+    def save_grid_to_file(self, file_path):
+        try:
+            with open(file_path, 'w') as file:
+                json.dump(self.grid, file, indent=4)
+        except IOError:
+            print(f"Error writing to file: {file_path}")
+
+    def set_button(self, row, col, data):
+        self.grid[row][col] = data
+        self.commands[row][col] = compileButton(data)
+
+# +=====+ Legacy configs +=====+ #
+
+def _legacyName(node):
+    # effect/color given as a bare name, a quoted name or None
+    if isinstance(node, ast.Constant) and node.value is None:
+        return None
+    if isinstance(node, ast.Name):
+        return None if node.id == "None" else node.id
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    raise ValueError(f"expected a function name, got {ast.unparse(node)}")
+
+class _NowRewriter(ast.NodeTransformer):
+    def visit_Call(self, node):
+        if _isLegacyTime(node):
+            return ast.copy_location(ast.Name("now", ast.Load()), node)
+        return self.generic_visit(node)
+
+def _legacyExpr(node):
+    # expression source with time.time() spelled as the press time name, now
+    return ast.unparse(_NowRewriter().visit(node))
+
+def _rewriteNow(source):
+    # source unchanged unless it uses time.time()
+    node = ast.parse(source, mode="eval").body
+    return _legacyExpr(node) if any(_isLegacyTime(n) for n in ast.walk(node)) else source
+
+def _legacyArgs(node):
+    if isinstance(node, ast.Constant) and node.value is None:
+        return None
+    if not isinstance(node, ast.List):
+        raise ValueError(f"args must be a list, got {ast.unparse(node)}")
+    args = []
+    for e in node.elts:
+        try:
+            args.append(ast.literal_eval(e))
+        except ValueError:
+            args.append(_legacyExpr(e))
+    return args
+
+def legacyToStructured(udp_str):
+    '''
+    "[[index, effect, effect_args, color, color_args, (misc)], ...]" -> versioned command object
+    '''
+    data = ast.parse(udp_str, mode="eval").body
+
+    # check if the result is a list
+    if not isinstance(data, ast.List):
+        raise ValueError("Input is not a list structure.")
+
+    # check if it is 2D (all elements are lists)
+    if not all(isinstance(item, ast.List) for item in data.elts):
+        raise ValueError("Input is a 1D list, but a 2D list is required.")
+
+    strips = []
+    for command in data.elts:
+        if len(command.elts) < 5:
+            raise ValueError(f"strip command needs 5 elements: {ast.unparse(command)}")
+        index, ef, ea, cf, ca = command.elts[0:5]
+        misc = ast.literal_eval(command.elts[5]) if len(command.elts) > 5 else None
+        if misc:
+            misc = _rewriteNow(misc)
+        strips.append({
+            "index": ast.literal_eval(index),
+            "effect": _legacyName(ef), "effect_args": _legacyArgs(ea),
+            "color": _legacyName(cf), "color_args": _legacyArgs(ca),
+            "misc": misc or None,
+        })
+    return {"version": COMMAND_VERSION, "strips": strips}
+
+def convertFile(file_path):
+    '''
+    rewrite a button config file with structured udp commands, returns the number of converted buttons
+    '''
+    with open(file_path, 'r') as file:
+        grid = json.load(file)
+    converted = 0
+    for row in grid:
+        for button in row:
+            changed = False
+            if isinstance(button[3], str):
+                button[3] = legacyToStructured(button[3])
+                changed = True
+            elif isinstance(button[3], dict):
+                # structured, but possibly still using time.time() in its expressions
+                for s in button[3].get("strips", []):
+                    for key in ("effect_args", "color_args", "misc"):
+                        value = s.get(key)
+                        values = value if isinstance(value, list) else [value]
+                        rewritten = [_rewriteNow(a) if isinstance(a, str) else a for a in values]
+                        if rewritten != values:
+                            s[key] = rewritten if isinstance(value, list) else rewritten[0]
+                            changed = True
+            if button[4] and _rewriteNow(button[4]) != button[4]:
+                button[4] = _rewriteNow(button[4])
+                changed = True
+            converted += changed
+    with open(file_path, 'w') as file:
+        json.dump(grid, file, indent=4)
+    return converted
+
+if __name__ == "__main__":
+    # python commands.py button_configs/*.json
+    for path in sys.argv[1:]:
+        print(f"{path}: converted {convertFile(path)} buttons")
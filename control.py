@@ -0,0 +1,92 @@
+# Local control socket, lets control surfaces (the GUI editor, a remote) drive a headless daemon
+#
+# Requests and replies are single JSON datagrams on 127.0.0.1:CONTROL_PORT
+#   {"cmd": "press", "button": [row, col]}
+#   {"cmd": "bpm", "value": 128} / {"cmd": "bpm", "add": -5}
+#   {"cmd": "load", "config": "main"}
+#   {"cmd": "status"}
+#   {"cmd": "stats"}  per stage / per fx timing histograms, see telemetry.py
+# Every reply carries "ok", plus "error" or the requested fields.
+import asyncio
+import json
+import queue
+import socket
+from network import getLoop
+
+CONTROL_PORT = 21325
+
+class _ControlProtocol(asyncio.DatagramProtocol):
+    def __init__(self, requests, received):
+        self.requests = requests
+        self.received = received
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            self.transport.sendto(b'{"ok": false, "error": "invalid json"}', addr)
+            return
+        if not isinstance(msg, dict):
+            self.transport.sendto(b'{"ok": false, "error": "request must be a json object"}', addr)
+            return
+        self.requests.put((msg, addr))
+        self.received()
+
+class ControlServer:
+    '''
+    Receives requests on the network loop and queues them, poll() hands them to the
+    thread that owns the buttons (main), which answers with reply()
+    '''
+    def __init__(self, port=CONTROL_PORT, host="127.0.0.1"):
+        self.loop = getLoop()
+        self._requests = queue.SimpleQueue()
+        # called from the network loop after each queued request, e.g. to wake the main loop
+        self.on_input = None
+        self.transport, _ = asyncio.run_coroutine_threadsafe(
+            self.loop.create_datagram_endpoint(lambda: _ControlProtocol(self._requests, self._received), local_addr=(host, port)),
+            self.loop,
+        ).result()
+
+    def _received(self):
+        if self.on_input is not None:
+            self.on_input()
+
+    def poll(self):
+        '''
+        [(request dict, reply address), ...] received since the last poll
+        '''
+        pending = []
+        while True:
+            try:
+                pending.append(self._requests.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def reply(self, addr, reply):
+        self.loop.call_soon_threadsafe(self.transport.sendto, json.dumps(reply).encode(), addr)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.transport.close)
+
+class ControlClient:
+    '''
+    Blocking client for control surfaces, request() returns the reply dict or None if the daemon does not answer
+    '''
+    def __init__(self, port=CONTROL_PORT, host="127.0.0.1", timeout=0.5):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+        self.sock.settimeout(timeout)
+
+    def request(self, cmd, **fields):
+        try:
+            self.sock.send(json.dumps({"cmd": cmd, **fields}).encode())
+            return json.loads(self.sock.recv(65536))
+        except (OSError, ValueError):
+            return None
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,74 @@
+# Render + send loop running on its own thread
+import threading
+import queue
+import time
+import traceback
+from clock import now
+from scheduler import FrameScheduler
+
+class Engine(threading.Thread):
+    '''
+    Renders Lights and sends frames on a dedicated thread at a fixed frame rate.
+    Other threads never touch Lights directly, they submit() commands that the
+    engine applies between frames, so MIDI bursts or a slow Tk repaint can't
+    delay light output.
+    '''
+    def __init__(self, lights, fps, output=None):
+        super().__init__(name="engine", daemon=True)
+        self.lights = lights
+        self.output = output
+        self.scheduler = FrameScheduler(fps)
+        self._commands = queue.SimpleQueue()
+        self._running = True
+        self.errors = 0 # frames that raised outside a strip (encode / send)
+        self.last_frame = None # perf_counter time the last frame finished
+
+    def submit(self, func, *args):
+        '''
+        queue func(lights, *args) to run on the engine thread before the next frame
+        '''
+        self._commands.put((func, args))
+
+    def _applyCommands(self):
+        while True:
+            try:
+                func, args = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                func(self.lights, *args)
+            except Exception:
+                # a bad button config must not take the lights down
+                traceback.print_exc()
+
+    def run(self):
+        while self._running:
+            if not self.scheduler.wait():
+                continue
+            self.scheduler.frame()
+            self._applyCommands()
+            frame_time = now()
+            if self.output is not None:
+                # synced output presents the frame lead seconds from now, so render for that time
+                frame_time += getattr(self.output, "lead", 0.0)
+            try:
+                self.lights.update(frame_time)
+                if self.output is not None:
+                    self.output.send(frame_time)
+            except Exception:
+                # log and keep going, the next frame may well succeed
+                self.errors += 1
+                traceback.print_exc()
+            self.last_frame = time.perf_counter()
+
+    def alive(self):
+        '''
+        True while the thread runs and has finished a frame in the last second
+        '''
+        return (self.is_alive() and self.last_frame is not None
+                and time.perf_counter() - self.last_frame < max(1.0, 10 * self.scheduler.frame_duration))
+
+    def stop(self):
+        self._running = False
+        self.scheduler.wake()
+        self.join()
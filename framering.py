@@ -0,0 +1,123 @@
+# Shared memory ring of rendered frames, one writer (Lights or the emulator) and any number of viewers
+#
+# Layout of the segment
+#   header     int64 [num_strips, strip_length, slots, seq, writer pid]   seq = last complete frame
+#   slot seqs  int64 [slots]                                   frame number held by each slot, -1 while written
+#   slots      uint8 [slots][num_strips][strip_length][3]      alpha premultiplied rgb
+# The writer never waits on viewers. A viewer copies the newest slot and checks its seq
+# before and after, so a slot overwritten mid copy is detected and read again.
+import os
+from multiprocessing import shared_memory
+import numpy as np
+from strip import premultiply
+
+RING_NAME = "udp-lights"
+HEADER = 5
+
+def _attachSegment(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # before 3.13 every attach registers the segment with the resource tracker,
+        # which would unlink it when the viewer exits
+        from multiprocessing import resource_tracker
+        segment = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+def _writerAlive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass # someone else's process, but running
+    return True
+
+class FrameRing:
+    def __init__(self, segment, owner):
+        self.segment = segment
+        self.name = segment.name
+        self.owner = owner
+        header = np.ndarray((HEADER,), dtype=np.int64, buffer=segment.buf)
+        self.num_strips, self.strip_length, self.slots = (int(v) for v in header[:3])
+        self._header = header
+        self._slot_seq = np.ndarray((self.slots,), dtype=np.int64, buffer=segment.buf, offset=HEADER * 8)
+        self.frames = np.ndarray((self.slots, self.num_strips, self.strip_length, 3), dtype=np.uint8,
+                                 buffer=segment.buf, offset=_dataOffset(self.slots))
+        self._work = np.empty((self.num_strips, self.strip_length, 3), dtype=np.float32)
+        self.last_seq = -1 # newest frame returned by read()
+
+    @classmethod
+    def create(cls, num_strips, strip_length, slots=4, name=RING_NAME):
+        '''
+        create the segment as its writer, replacing a stale one left behind by a crashed writer.
+        raises FileExistsError if the ring's writer is still running
+        '''
+        size = _dataOffset(slots) + slots * num_strips * strip_length * 3
+        try:
+            segment = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            pid = int(np.ndarray((HEADER,), dtype=np.int64, buffer=stale.buf)[4]) if stale.size >= HEADER * 8 else 0
+            if _writerAlive(pid):
+                stale.close()
+                raise FileExistsError(f"frame ring {name!r} is being written by process {pid}") from None
+            stale.close()
+            stale.unlink()
+            segment = shared_memory.SharedMemory(name, create=True, size=size)
+        header = np.ndarray((HEADER,), dtype=np.int64, buffer=segment.buf)
+        header[:] = (num_strips, strip_length, slots, -1, os.getpid())
+        np.ndarray((slots,), dtype=np.int64, buffer=segment.buf, offset=HEADER * 8)[:] = -1
+        return cls(segment, owner=True)
+
+    @classmethod
+    def attach(cls, name=RING_NAME):
+        '''
+        attach to an existing ring as a viewer, raises FileNotFoundError if nothing is publishing
+        '''
+        return cls(_attachSegment(name), owner=False)
+
+    def write(self, frame):
+        '''
+        publish a (num_strips, strip_length, 4) float rgba frame (Lights.frame) or a
+        (num_strips, strip_length, 3) uint8 rgb frame into the next slot
+        '''
+        seq = int(self._header[3]) + 1
+        slot = seq % self.slots
+        self._slot_seq[slot] = -1
+        if frame.shape[-1] == 4:
+            premultiply(frame, self.frames[slot], self._work)
+        else:
+            np.copyto(self.frames[slot], frame)
+        self._slot_seq[slot] = seq
+        self._header[3] = seq
+
+    def read(self, out):
+        '''
+        copy the newest frame into out, returns False if there is no frame newer than the last read
+        '''
+        while True:
+            seq = int(self._header[3])
+            if seq < 0 or seq == self.last_seq:
+                return False
+            slot = seq % self.slots
+            if self._slot_seq[slot] != seq:
+                continue
+            np.copyto(out, self.frames[slot])
+            if self._slot_seq[slot] == seq:
+                self.last_seq = seq
+                return True
+
+    def close(self):
+        # drop our views before closing, the segment can't be unmapped while they exist
+        self._header = self._slot_seq = self.frames = None
+        self.segment.close()
+        if self.owner:
+            self.segment.unlink()
+
+def _dataOffset(slots):
+    # slot data starts on a 64 byte boundary after the header and slot seqs
+    return -(-(HEADER + slots) * 8 // 64) * 64
@@ -1,30 +1,30 @@
 # Defines color functions for single strip strip[] -> strip[] modifies rgb values
+#
+# t is the frame timestamp passed down by Lights.update (clock.now() when called directly)
 import colorsys
-import time
+from clock import now
+from fx.registry import color
 
-def idleColor(strip):
+@color
+def idleColor(strip, *, t=None):
     return strip
 
-def solid(strip, r, g, b):
-    new_strip = strip
-    
-    for led in new_strip:
-        led[0] = r
-        led[1] = g
-        led[2] = b
-
-    return new_strip
-
-def rainbow(strip):
+@color
+def solid(strip, r, g, b, *, t=None):
+    strip[..., 0] = r
+    strip[..., 1] = g
+    strip[..., 2] = b
+    return strip
 
-    new_strip = strip
-    h = time.time() / 10 % 1
+@color
+def rainbow(strip, *, t=None):
+    if t is None:
+        t = now()
+    h = t / 10 % 1
     r, g, b = colorsys.hsv_to_rgb(h, 1.0, 1.0)
 
-    for led in new_strip:
-        led[0] = int(r * 255)
-        led[1] = int(g * 255)
-        led[2] = int(b * 255)
-
-    return new_strip
+    strip[..., 0] = int(r * 255)
+    strip[..., 1] = int(g * 255)
+    strip[..., 2] = int(b * 255)
+    return strip
     
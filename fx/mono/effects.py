@@ -1,166 +1,154 @@
 # Defines effect functions strip[] -> strip[] modifies alpha values
-import time
-import math
-import random
+#
+# strip is a [..., led, 4] numpy array, so an effect also works on the whole
+# (num_strips, strip_length, 4) Lights.frame in one call, unless its args place it
+# on one strip (@effect(grid=False))
+#
+# t is the frame timestamp passed down by Lights.update (clock.now() when called directly)
+from clock import now
+from fx.registry import effect
+from functools import lru_cache
+import numpy as np
+
+# led positions 0..n-1, shared between calls
+@lru_cache(maxsize=None)
+def _ledIndex(n):
+    idx = np.arange(n, dtype=np.float64)
+    idx.flags.writeable = False
+    return idx
 
 # idle
-def idleEffect(strip):
+@effect
+def idleEffect(strip, *, t=None):
     return strip
 
 # sin
-def sinWave(strip, bpm, wave_length=5):
-    new_strip = strip
-
-    for i in range(len(new_strip)):
-        new_strip[i][3] = (math.sin(2 * math.pi * (time.time() / 60) * bpm + i / wave_length) + 1)/2 * 255
-
-    return new_strip
+@effect
+def sinWave(strip, bpm, wave_length=5, *, t=None):
+    if t is None:
+        t = now()
+    i = _ledIndex(strip.shape[-2])
+    strip[..., 3] = (np.sin(2 * np.pi * (t / 60) * bpm + i / wave_length) + 1) / 2 * 255
+    return strip
 
 # chase
-def chase(strip, bpm, length=10, lifetime = 0.5):
-    new_strip = strip
+@effect
+def chase(strip, bpm, length=10, lifetime = 0.5, *, t=None):
+    if t is None:
+        t = now()
+    i = _ledIndex(strip.shape[-2])
 
     b = 60 / bpm # amount of time between led peaks (sec)
 
     c = 255 * ((b/lifetime) - 1) # idek
 
-    for i in range(len(new_strip)):
-        new_strip[i][3] = ((-(time.time() - i * lifetime / length) % b) / b * (255 + c)) - c
-        if new_strip[i][3] < 0:
-            new_strip[i][3] = 0
-
-    return new_strip
+    alpha = (np.mod(-(t - i * (lifetime / length)), b) / b * (255 + c)) - c
+    strip[..., 3] = np.maximum(alpha, 0)
+    return strip
 
 
 # rain
-def rain(strip, bpm, drop_length=20, density=0.5):
-    new_strip = strip
-    n = len(new_strip)
-    
-    t = time.time() * (bpm / 60)
-    
-    for i in range(n):
-        lane_seed = math.sin(i * 0.5) * 1000 * random.random()
-        drop_val = (t + lane_seed) % 10.0 
-        
-        if drop_val < 1.0:
-            brightness = (1.0 - drop_val) * 255
-        
-            if (math.sin(i + (t // 10)) > (1 - density)):
-                new_strip[i][3] = brightness
-            else:
-                new_strip[i][3] = 0
-        else:
-            new_strip[i][3] = 0
-            
-    return new_strip
+@effect
+def rain(strip, bpm, drop_length=20, density=0.5, *, t=None):
+    if t is None:
+        t = now()
+    t = t * (bpm / 60)
+    i = _ledIndex(strip.shape[-2])
+
+    lane_seed = np.sin(i * 0.5) * 1000 * np.random.random(strip.shape[:-1])
+    drop_val = np.mod(t + lane_seed, 10.0)
+
+    lit = (drop_val < 1.0) & (np.sin(i + (t // 10)) > (1 - density))
+    strip[..., 3] = np.where(lit, (1.0 - drop_val) * 255, 0)
+    return strip
 
 # bounce
-def bounce(strip, bpm, width=4):
-    new_strip = strip
-    n = len(new_strip)
-    
-    t = time.time() * (bpm / 60)
+@effect
+def bounce(strip, bpm, width=4, *, t=None):
+    if t is None:
+        t = now()
+    n = strip.shape[-2]
+    i = _ledIndex(n)
+
+    t = t * (bpm / 60)
     triangle_wave = 1 - abs((2 * t) % 2 - 1)
     center = triangle_wave * (n - 1)
-    
-    for i in range(n):
-        dist = abs(i - center)
-        if dist < width:
-            new_strip[i][3] = (1 - (dist / width)) * 255
-        else:
-            new_strip[i][3] = 0
-            
-    return new_strip
+
+    strip[..., 3] = np.maximum(1 - np.abs(i - center) / width, 0) * 255
+    return strip
 
 # strobe
-def strobe(strip, bpm, offset=0):
-    new_strip = strip
-
-    if (time.time() + offset/100) % (60.0/bpm) < (30.0/bpm):
-        for led in new_strip:
-            led[3] = 255
-    else:
-        for led in new_strip:
-            led[3] = 0
-    
-    return new_strip
+@effect
+def strobe(strip, bpm, offset=0, *, t=None):
+    if t is None:
+        t = now()
+    on = (t + offset/100) % (60.0/bpm) < (30.0/bpm)
+    strip[..., 3] = 255 if on else 0
+    return strip
 
 # pulse
-def pulse(strip, start_time, speed=5):
-    new_strip = strip
-    
-    alpha = 1 / (((time.time() - start_time) * speed) + 0.8)
-
-    for led in new_strip:
-        led[3] = min(255, int(alpha * 255))
-
-    return new_strip
+@effect
+def pulse(strip, start_time, speed=5, *, t=None):
+    if t is None:
+        t = now()
+    alpha = 1 / (((t - start_time) * speed) + 0.8)
+    strip[..., 3] = min(255, int(alpha * 255))
+    return strip
 
 # ------ FOR POLY FUNCTIONS --------
 
 # fade in out
-def fadeInOut(strip, bpm, offset=0):
-    new_strip = strip
-    for led in new_strip:
-        led[3] = (math.sin(2 * math.pi * (time.time() / 60) * bpm + offset) + 1)/2 * 255
-    return new_strip
-
+@effect
+def fadeInOut(strip, bpm, offset=0, *, t=None):
+    if t is None:
+        t = now()
+    strip[..., 3] = (np.sin(2 * np.pi * (t / 60) * bpm + offset) + 1) / 2 * 255
+    return strip
 
-def swipe(strip, bpm, rank=0, total=3):
-    new_strip = strip
 
+@effect(grid=False) # rank is the strip's place in the swipe
+def swipe(strip, bpm, rank=0, total=3, *, t=None):
+    if t is None:
+        t = now()
     cycleTime = 60 * 2/(bpm)
 
-    x = time.time() % cycleTime
-
-    for led in new_strip:
-        if x < (rank + 1) * cycleTime / total and x > rank * cycleTime / total:
-            led[3] = 255
-        else:
-            led[3] = 0
-        
-    return new_strip
-
-def radialPulse(strip, bpm, strip_idx=0, center_x=0, center_y=0, width=5):
-    new_strip = strip
-    t = (time.time() * (bpm / 60)) % 15 # The "radius" of the ripple expanding
-    
-    for led_idx in range(len(new_strip)):
-        # 2D distance calculation: x = strip_idx, y = led_idx
-        dx = strip_idx - center_x
-        dy = led_idx - center_y
-        dist = math.sqrt(dx**2 + dy**2)
-        
-        # Check if this LED is on the "edge" of the expanding ripple
-        diff = abs(dist - t * 5) # Multiply t by speed factor
-        
-        if diff < width:
-            # Fade based on distance from the ripple's edge
-            new_strip[led_idx][3] = (1 - (diff / width)) * 255
-        else:
-            new_strip[led_idx][3] = 0
-            
-    return new_strip
-
-def diamondPulse(strip, bpm, strip_idx=0, center_x=0, center_y=0, width=4):
-    new_strip = strip
+    x = t % cycleTime
+
+    on = x < (rank + 1) * cycleTime / total and x > rank * cycleTime / total
+    strip[..., 3] = 255 if on else 0
+    return strip
+
+# strip_idx is the strip's x position. Called directly it may be an array (e.g. np.arange(num_strips)[:, None])
+# to render the whole grid at once, but the scalar a button gives it only fits one strip
+@effect(grid=False)
+def radialPulse(strip, bpm, strip_idx=0, center_x=0, center_y=0, width=5, *, t=None):
+    if t is None:
+        t = now()
+    t = (t * (bpm / 60)) % 15 # The "radius" of the ripple expanding
+
+    # 2D distance calculation: x = strip_idx, y = led_idx
+    dx = np.asarray(strip_idx, dtype=np.float64) - center_x
+    dy = _ledIndex(strip.shape[-2]) - center_y
+    dist = np.sqrt(dx**2 + dy**2)
+
+    # Distance of each LED from the "edge" of the expanding ripple
+    diff = np.abs(dist - t * 5) # Multiply t by speed factor
+
+    # Fade based on distance from the ripple's edge
+    strip[..., 3] = np.maximum(1 - diff / width, 0) * 255
+    return strip
+
+@effect(grid=False) # strip_idx like radialPulse
+def diamondPulse(strip, bpm, strip_idx=0, center_x=0, center_y=0, width=4, *, t=None):
+    if t is None:
+        t = now()
     # t is our expanding radius
-    t = (time.time() * (bpm / 60) * 8) % 60 
-    
-    for led_idx in range(len(new_strip)):
-        # Manhattan Distance: sum of absolute differences
-        dist = abs(strip_idx - center_x) + abs(led_idx - center_y)
-        
-        # Check proximity to the ripple edge
-        diff = abs(dist - t)
-        
-        if diff < width:
-            # Linear fade for the diamond's edge
-            new_strip[led_idx][3] = (1 - (diff / width)) * 255
-        else:
-            new_strip[led_idx][3] = 0
-            
-    return new_strip
+    t = (t * (bpm / 60) * 8) % 60
 
+    # Manhattan Distance: sum of absolute differences
+    dist = np.abs(np.asarray(strip_idx, dtype=np.float64) - center_x) + np.abs(_ledIndex(strip.shape[-2]) - center_y)
 
+    # Linear fade for the diamond's edge
+    diff = np.abs(dist - t)
+    strip[..., 3] = np.maximum(1 - diff / width, 0) * 255
+    return strip
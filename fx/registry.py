@@ -0,0 +1,81 @@
+# Registry of every effect and color, filled once at import time by decorators
+#
+#   @effect  mono effect   strip -> strip, modifies alpha values
+#   @color   color func    strip -> strip, modifies rgb values
+#   @poly    poly effect   Lights -> None, sets effects across strips
+#
+# Effects and colors are grid fx by default: given the args of one strip they render the
+# whole (num_strips, strip_length, 4) Lights.frame in one call just as well. Fx whose args
+# depend on which strip they run on (a rank, a strip index) are declared @effect(grid=False).
+import importlib
+import inspect
+
+MODULES = ("fx.mono.effects", "fx.mono.colors", "fx.poly.effects", "fx.poly.colors")
+
+class FxInfo:
+    def __init__(self, func, kind, grid):
+        self.func = func
+        self.name = func.__name__
+        self.kind = kind # "mono", "color" or "poly"
+        self.grid = grid # can render the whole Lights.frame in one call, never for poly
+        # [(param_name, default), ...] after the strip / lights argument, keyword-only
+        # params (the frame timestamp t) are supplied by the pipeline and left out
+        sig = inspect.signature(func)
+        self.params = [
+            (p.name, None if p.default is inspect.Parameter.empty else p.default)
+            for p in list(sig.parameters.values())[1:]
+            if p.kind != inspect.Parameter.KEYWORD_ONLY
+        ]
+
+_fx = {}
+_loaded = False
+
+def _register(kind, grid):
+    def decorator(func):
+        if func.__name__ in _fx:
+            raise ValueError(f"fx {func.__name__!r} is already registered")
+        _fx[func.__name__] = FxInfo(func, kind, grid)
+        return func
+    return decorator
+
+def effect(func=None, *, grid=True):
+    decorator = _register("mono", grid)
+    return decorator(func) if func is not None else decorator
+
+def color(func=None, *, grid=True):
+    decorator = _register("color", grid)
+    return decorator(func) if func is not None else decorator
+
+def poly(func):
+    return _register("poly", False)(func)
+
+def load():
+    '''
+    import every fx module so the registry is complete
+    '''
+    global _loaded
+    if not _loaded:
+        for module in MODULES:
+            importlib.import_module(module)
+        _loaded = True
+
+def get(name, kind=None):
+    '''
+    FxInfo for name, raises KeyError if unknown (or not of the given kind)
+    '''
+    load()
+    info = _fx.get(name)
+    if info is None or (kind is not None and info.kind != kind):
+        raise KeyError(name)
+    return info
+
+def entries(kind=None):
+    load()
+    return [info for info in _fx.values() if kind is None or info.kind == kind]
+
+def namespace():
+    '''
+    name -> function for every registered fx, for resolving names in button expressions
+    '''
+    load()
+    return {name: info.func for name, info in _fx.items()}
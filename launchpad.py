@@ -1,40 +1,77 @@
 import mido
 import time
-import json
+import queue
+from commands import ButtonGrid
+from clock import now
 
-class Launchpad:
+class Launchpad(ButtonGrid):
 
     def __init__(self):
-        self.grid = [[[3, False, None, None, None] for _ in range(9)] for _ in range(9)]
+        super().__init__([[[3, False, None, None, None] for _ in range(9)] for _ in range(9)])
 
         self.inport = None
         self.outport = None
+        self.use_sysex = False
+        # called from the midi thread after each message, e.g. to wake the main loop
+        self.on_input = None
+        self._inputs = queue.SimpleQueue()
 
         for midi in mido.get_input_names():
             if 'Launchpad' in midi:
-                self.inport = mido.open_input(midi)
+                self.inport = mido.open_input(midi, callback=self._on_midi)
                 self.outport = mido.open_output(midi)
+                # MK2 can set many LEDs with one SysEx message
+                self.use_sysex = 'MK2' in midi
+
+        # colors currently shown on the pad, update() only sends what differs
+        self.invalidate()
 
         if self.inport is None:
             raise IOError('No launchpad detected')
 
+    def _on_midi(self, msg):
+        # runs on the midi backend thread as soon as a message arrives, stamp it with the frame clock
+        if hasattr(msg, "note"):
+            self._inputs.put({"button": [int((msg.note - 10) / 10), (msg.note % 10) - 1], "on": msg.velocity==127, "time": now()})
+            if self.on_input is not None:
+                self.on_input()
+
     def get_midi(self):
+            '''
+            messages received since the last call, each with its arrival time from clock.now()
+            '''
             inputs = []
-            for msg in self.inport.iter_pending():
-                if hasattr(msg, "note"):
-                    inputs.append({"button": [int((msg.note - 10) / 10), (msg.note % 10) - 1], "on": msg.velocity==127})
-            return inputs
+            while True:
+                try:
+                    inputs.append(self._inputs.get_nowait())
+                except queue.Empty:
+                    return inputs
 
     def msg_to_grid(self, msg):
         return lp.grid[msg["button"][0]][msg["button"][1]]
 
+    def invalidate(self):
+        '''
+        forget the shadow state so the next update() resends every pad
+        '''
+        self._shown = [[None] * 9 for _ in range(9)]
+
     def update(self):
+        changed = []
         for i in range(9):
             for j in range(9):
-                if self.grid[i][j][1]:
-                    self._set_color([i, j], self.grid[i][j][0])
-                else:
-                    self._set_color([i, j], 0)
+                color = self.grid[i][j][0] if self.grid[i][j][1] else 0
+                if self._shown[i][j] != color:
+                    self._shown[i][j] = color
+                    changed.append(([i, j], color))
+
+        if not changed:
+            return
+        if self.use_sysex:
+            self._set_colors(changed)
+        else:
+            for button, color in changed:
+                self._set_color(button, color)
 
     def _grid_to_note(self, button):
         return ((button[0] + 1) * 10) + button[1] + 1
@@ -42,28 +79,19 @@ class Launchpad:
     def _set_color(self, button, color):
         msg = mido.Message('note_on', note=self._grid_to_note(button), velocity=color)
         self.outport.send(msg)
+
+    def _set_colors(self, changes):
+        # Launchpad MK2 "set LEDs" SysEx: F0 00 20 29 02 18 0A <led> <color> ... F7, up to 80 LEDs each
+        for k in range(0, len(changes), 80):
+            data = [0x00, 0x20, 0x29, 0x02, 0x18, 0x0A]
+            for button, color in changes[k:k + 80]:
+                data += [self._grid_to_note(button), color]
+            self.outport.send(mido.Message('sysex', data=data))
     
     def close_ports(self):
         self.inport.close()
         self.outport.close()
 
-    def load_grid_from_file(self, file_path):
-        try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-                self.grid = data
-        except FileNotFoundError:
-            print(f"File not found: {file_path}")
-        except json.JSONDecodeError:
-            print(f"Invalid JSON data in file: {file_path}")
-    
-    def save_grid_to_file(self, file_path):
-        try:
-            with open(file_path, 'w') as file:
-                json.dump(self.grid, file, indent=4)
-        except IOError:
-            print(f"Error writing to file: {file_path}")
-
 
 
 
@@ -78,7 +106,7 @@ if __name__ == "__main__":
                 else:
                     lp.msg_to_grid(msg)[1] = True
                 
-        lp.update_button_colors()
+        lp.update()
         time.sleep(0.08)
 
     lp.close_ports()
@@ -1,7 +1,7 @@
 import customtkinter as ctk
 import os
 import json
-import ast
+from commands import compileGrid, compileButton, legacyToStructured, COMMAND_VERSION
 
 # Optional: load effect/color metadata for forms (skip if fx not available)
 try:
@@ -29,80 +29,23 @@ def _parse_param_value(s):
     return s
 
 
-def _args_to_udp_part(vals):
-    """Build UDP-safe string for args list. None or all blank -> None."""
+def _args_to_structured(vals):
+    """Build the args list of a structured command. None or all blank -> None."""
     if vals is None:
-        return "None"
+        return None
     filled = []
     for v in vals:
         if v is None:
             continue
         if isinstance(v, str) and v.strip() == "":
             continue
-        filled.append(v)
-    if not filled:
-        return "None"
-    # Build list string for eval: numbers as literals, identifiers/expressions unquoted
-    parts = []
-    for v in filled:
-        if isinstance(v, (int, float)):
-            parts.append(repr(v))
-        else:
-            parts.append(str(v))
-    return "[" + ", ".join(parts) + "]"
-
-
-def _split_by_comma_at_depth(s):
-    """Split string by commas at depth 0 (depth counted by [ and ] and ( and ))."""
-    s = (s or "").strip()
-    if not s:
-        return []
-    depth = 0
-    start = 0
-    parts = []
-    i = 0
-    while i < len(s):
-        c = s[i]
-        if c in "[(":
-            depth += 1
-        elif c in "])":
-            depth -= 1
-        elif c == "," and depth == 0:
-            parts.append(s[start:i].strip())
-            start = i + 1
-        i += 1
-    if start < len(s):
-        parts.append(s[start:].strip())
-    return parts
-
-
-def _split_list_elements(list_str):
-    """Given a string like '[time.time(), 10]' or 'None', return list of param source strings or None."""
-    list_str = (list_str or "").strip()
-    if not list_str or list_str == "None":
-        return None
-    if list_str[0] != "[":
-        return None
-    inner = list_str[1:-1].strip()
-    if not inner:
-        return []
-    return _split_by_comma_at_depth(inner)
-
-
-def _safe_udp_namespace():
-    """Namespace for eval'ing UDP config strings: None + effect/color names as strings + bpm + time module."""
-    ns = {"None": None, "null": None}
-    for name in _effect_meta:
-        ns[name] = name
-    for name in _color_meta:
-        ns[name] = name
-    ns["bpm"] = "bpm"
-    ns["time"] = __import__("time")  # so time.time() in effect args (e.g. pulse) evaluates
-    return ns
+        # numbers stay literals, identifiers/expressions (e.g. bpm) stay strings
+        filled.append(v if isinstance(v, (int, float)) else str(v))
+    return filled or None
 
 
 def _parse_udp_for_strip_zero(udp_val):
-    """Parse UDP string and return (effect_name, effect_args, color_name, color_args) for strip 0.
+    """Parse UDP command and return (effect_name, effect_args, color_name, color_args) for strip 0.
     Returns (None, None, None, None) if not parseable or no strip 0."""
     strips = _parse_udp_all_strips(udp_val)
     for idx, ef_name, ea, cf_name, ca, misc in strips:
@@ -111,98 +54,27 @@ def _parse_udp_for_strip_zero(udp_val):
     return None, None, None, None
 
 
-def _parse_udp_all_strips_raw(udp_val):
-    """Parse UDP string keeping effect/color args as source strings (no eval of args). Returns same format as _parse_udp_all_strips or [] on failure."""
-    if not udp_val or not isinstance(udp_val, str) or udp_val.strip() == "":
-        return []
-    s = udp_val.strip()
-    if s[0] != "[" or len(s) < 2:
-        return []
-    inner = s[1:-1].strip()
-    if not inner:
-        return []
-    cmd_strings = _split_by_comma_at_depth(inner)
-    if not cmd_strings:
-        return []
-    ns = _safe_udp_namespace()
-    out = []
-    for cmd_str in cmd_strings:
-        cmd_str = cmd_str.strip()
-        if cmd_str[0] != "[" or len(cmd_str) < 2:
-            continue
-        elem_inner = cmd_str[1:-1].strip()
-        elems = _split_by_comma_at_depth(elem_inner)
-        if len(elems) < 5:
-            continue
-        try:
-            idx = eval(elems[0], ns)
-        except Exception:
-            continue
-        try:
-            ef = eval(elems[1], ns)
-        except Exception:
-            ef = elems[1].strip() if elems[1].strip() and elems[1].strip() != "None" else None
-        try:
-            cf = eval(elems[3], ns)
-        except Exception:
-            cf = elems[3].strip() if elems[3].strip() and elems[3].strip() != "None" else None
-        ef_name = getattr(ef, "__name__", None) if not isinstance(ef, str) else (ef if ef else None)
-        cf_name = getattr(cf, "__name__", None) if not isinstance(cf, str) else (cf if cf else None)
-        ea = _split_list_elements(elems[2])
-        ca = _split_list_elements(elems[4])
-        misc = None
-        if len(elems) > 5:
-            try:
-                misc = eval(elems[5], ns)
-            except Exception:
-                misc = elems[5].strip() or None
-        if misc is not None and isinstance(misc, str) and misc.strip() == "":
-            misc = None
-        out.append((idx, ef_name, ea, cf_name, ca, misc))
-    return out
-
-
 def _parse_udp_all_strips(udp_val):
-    """Parse UDP string and return list of (index, effect_name, effect_args, color_name, color_args, misc).
-    effect_args and color_args are kept as lists of source strings when possible (e.g. 'time.time()' not evaluated)."""
-    if not udp_val or not isinstance(udp_val, str) or udp_val.strip() == "":
+    """Read a structured UDP command (legacy strings are converted first) in one pass.
+    Returns list of (index, effect_name, effect_args, color_name, color_args, misc), [] on failure.
+    effect_args and color_args are lists of display strings (e.g. 'now', '10')."""
+    if not udp_val:
         return []
-    # Prefer raw parse so param fields show source (e.g. time.time()) not evaluated values
-    raw = _parse_udp_all_strips_raw(udp_val)
-    if raw:
-        return raw
     try:
-        data = ast.literal_eval(udp_val)
-    except (ValueError, SyntaxError):
-        ns = _safe_udp_namespace()
-        while True:
-            try:
-                data = eval(udp_val, ns)
-                break
-            except NameError as e:
-                name = getattr(e, "name", None)
-                if name and name not in ns:
-                    ns[name] = name
-                else:
-                    return []
-            except Exception:
-                return []
-    if not isinstance(data, list) or not data:
+        if isinstance(udp_val, str):
+            udp_val = legacyToStructured(udp_val)
+        strips = udp_val["strips"]
+    except (ValueError, SyntaxError, TypeError, KeyError):
         return []
     out = []
-    for cmd in data:
-        if not isinstance(cmd, list) or len(cmd) < 5:
-            continue
-        idx, ef, ea, cf, ca = cmd[0], cmd[1], cmd[2], cmd[3], cmd[4]
-        misc = cmd[5] if len(cmd) > 5 else None
-        if misc is not None and isinstance(misc, str) and misc.strip() == "":
-            misc = None
-        ef_name = getattr(ef, "__name__", None) if not isinstance(ef, str) else (ef if ef else None)
-        cf_name = getattr(cf, "__name__", None) if not isinstance(cf, str) else (cf if cf else None)
-        # Convert evaluated args to strings for display (we've lost the original source)
-        ea_str = [str(x) for x in ea] if ea is not None and isinstance(ea, (list, tuple)) else None
-        ca_str = [str(x) for x in ca] if ca is not None and isinstance(ca, (list, tuple)) else None
-        out.append((idx, ef_name, ea_str, cf_name, ca_str, misc))
+    for s in strips:
+        ea, ca = s.get("effect_args"), s.get("color_args")
+        out.append((
+            s.get("index"),
+            s.get("effect"), [str(a) for a in ea] if ea is not None else None,
+            s.get("color"), [str(a) for a in ca] if ca is not None else None,
+            s.get("misc") or None,
+        ))
     return out
 
 
@@ -212,9 +84,10 @@ def _default_grid():
 
 
 class LaunchpadGUI(ctk.CTk):
-    def __init__(self, lp_instance, num_strips=8):
+    def __init__(self, lp_instance, num_strips=8, remote=None):
         super().__init__()
-        self.lp = lp_instance  # None when Launchpad not connected
+        self.lp = lp_instance  # Launchpad / ButtonGrid of the running show, None when editing standalone
+        self.remote = remote  # ControlClient when attached to a headless daemon
         self.num_strips = num_strips
         self.current_file_path = None
         self.selected_coords = (0, 0)
@@ -311,6 +184,10 @@ class LaunchpadGUI(ctk.CTk):
         self._setup_editor_ui()
 
         self.buttons = [[None for _ in range(9)] for _ in range(9)]
+        # shadow state of what the grid currently shows, so sync() only touches changed widgets
+        self._shown_colors = [[None for _ in range(9)] for _ in range(9)]
+        self._highlighted = None
+        self._shown_bpm = None
         self._build_grid()
         # Load initial selection into the editor form so (0,0) is shown
         self._select_button(0, 0)
@@ -382,7 +259,17 @@ class LaunchpadGUI(ctk.CTk):
             except (OSError, json.JSONDecodeError) as e:
                 self.status_label.configure(text=f"Error loading: {e}", text_color="#FF4444")
                 return
-            self.status_label.configure(text=f"Loaded: {selected}", text_color="#00FF00")
+            if self.remote is not None:
+                self.remote.request("load", config=selected)
+                # attached, nothing else repaints the pads
+                self.sync()
+            # compile up front so broken buttons show up now instead of on a press
+            _, errors = compileGrid(self.grid)
+            if errors:
+                (r, c), e = errors[0]
+                self.status_label.configure(text=f"Loaded: {selected} ({len(errors)} bad, first {r},{c}: {e})", text_color="#FFAA00")
+            else:
+                self.status_label.configure(text=f"Loaded: {selected}", text_color="#00FF00")
             # Refresh editor form so it shows the current cell's data from the loaded grid
             r, c = self.selected_coords
             self._select_button(r, c)
@@ -761,15 +648,15 @@ class LaunchpadGUI(ctk.CTk):
         self._update_grid_button_highlight()
 
     def _update_grid_button_highlight(self):
-        """Outline the selected grid cell with a white border."""
+        """Outline the selected grid cell with a white border (only the old and new cell are touched)."""
+        if self._highlighted == self.selected_coords:
+            return
+        if self._highlighted is not None:
+            r, c = self._highlighted
+            self.buttons[r][c].configure(border_width=1, border_color=self.theme["button_border"])
         sr, sc = self.selected_coords
-        for r in range(9):
-            for c in range(9):
-                btn = self.buttons[r][c]
-                if (r, c) == (sr, sc):
-                    btn.configure(border_width=2, border_color="#ffffff")
-                else:
-                    btn.configure(border_width=1, border_color=self.theme["button_border"])
+        self.buttons[sr][sc].configure(border_width=2, border_color="#ffffff")
+        self._highlighted = self.selected_coords
 
     def _collect_param_values(self, entries_holder):
         """Collect non-blank param values in order. Blank -> omit from list."""
@@ -789,25 +676,29 @@ class LaunchpadGUI(ctk.CTk):
         # Push current form into strips_data before building UDP
         self._push_current_strip_to_data()
 
-        # Build UDP from all strips (each command can have 6th element misc)
-        parts = []
+        # Build the structured UDP command from all strips (each can have its own misc)
+        strips = []
         for idx in sorted(self.strip_indices):
             d = self.strips_data.get(idx, {})
-            ef = d.get("effect_name") or "None"
-            ea = _args_to_udp_part(d.get("effect_args"))
-            cf = d.get("color_name") or "None"
-            ca = _args_to_udp_part(d.get("color_args"))
-            misc = d.get("misc")
-            misc_str = repr(misc) if misc else "None"
-            parts.append(f"[{idx}, {ef}, {ea}, {cf}, {ca}, {misc_str}]")
-        udp_val = "[" + ", ".join(parts) + "]"
+            strips.append({
+                "index": idx,
+                "effect": d.get("effect_name"), "effect_args": _args_to_structured(d.get("effect_args")),
+                "color": d.get("color_name"), "color_args": _args_to_structured(d.get("color_args")),
+                "misc": d.get("misc") or None,
+            })
+        udp_val = {"version": COMMAND_VERSION, "strips": strips}
 
         # Per-strip misc is in UDP; top-level func kept for compatibility (None when using strips)
         func_val = None
         new_data = [new_color, new_on, http_val, udp_val, func_val]
+        try:
+            compileButton(new_data)
+        except (ValueError, SyntaxError, TypeError) as e:
+            self.status_label.configure(text=f"Not saved: {e}", text_color="#FF4444")
+            return
         self.grid[row][col] = new_data
         if self.lp is not None:
-            self.lp.grid[row][col] = new_data
+            self.lp.set_button(row, col, new_data)
         if self.current_file_path:
             try:
                 with open(self.current_file_path, "w") as f:
@@ -816,19 +707,51 @@ class LaunchpadGUI(ctk.CTk):
                 print(f"Error saving config: {e}")
             if self.lp is not None:
                 self.lp.save_grid_to_file(self.current_file_path)
+            if self.remote is not None:
+                # daemon reloads the file we just wrote
+                self.remote.request("load", config=os.path.splitext(os.path.basename(self.current_file_path))[0])
+        if self.remote is not None:
+            self.sync()
 
     def sync(self, bpm=None):
         if bpm is not None:
             self.bpm = bpm
-            self.bpm_label.configure(text=str(int(round(bpm))))
+            if bpm != self._shown_bpm:
+                self._shown_bpm = bpm
+                self.bpm_label.configure(text=str(int(round(bpm))))
         # Use GUI-owned grid for button colors (works with or without Launchpad connected)
         for r in range(9):
+            row = self.grid[r]
+            shown = self._shown_colors[r]
             for c in range(9):
-                color_code, is_on, _, __, ___ = self.grid[r][c]
+                color_code, is_on = row[c][0], row[c][1]
                 target_hex = self.color_palette.get(color_code, "#FFFFFF") if is_on else self.theme["button_off"]
-                btn = self.buttons[r][c]
-                if btn.cget("fg_color") != target_hex:
-                    btn.configure(fg_color=target_hex, hover_color=target_hex)
+                if shown[c] != target_hex:
+                    shown[c] = target_hex
+                    self.buttons[r][c].configure(fg_color=target_hex, hover_color=target_hex)
         self._update_grid_button_highlight()
         self.update_idletasks()
-        self.update()
\ No newline at end of file
+        self.update()
+
+
+if __name__ == "__main__":
+    # Standalone editor attached to a running `python main.py --headless` daemon
+    import argparse
+    from control import ControlClient, CONTROL_PORT
+
+    parser = argparse.ArgumentParser(description="Launchpad config editor for a headless daemon")
+    parser.add_argument("--control-port", type=int, default=CONTROL_PORT)
+    parser.add_argument("--num-strips", type=int, default=6)
+    args = parser.parse_args()
+
+    client = ControlClient(args.control_port)
+    gui = LaunchpadGUI(None, num_strips=args.num_strips, remote=client)
+
+    def poll_status():
+        status = client.request("status")
+        # the daemon's main loop isn't here to sync the pads, this does it once a second
+        gui.sync(bpm=status.get("bpm") if status is not None else None)
+        gui.after(1000, poll_status)
+
+    poll_status()
+    gui.mainloop()
@@ -1,17 +1,49 @@
-from strip import Strip
+import traceback
+from strip import Strip, premultiply
+import numpy as np
+from time import perf_counter
+from clock import now
+import telemetry
 
 class Lights:
     def __init__(self, strip_length=80, num_strips=6, wled_addr = {"192.168.0.101": [0, 1, 2], "192.168.0.100": [3, 4, 5]}, port=21324):
         self.num_strips = num_strips
         self.strip_length = strip_length
-        self.strips = [Strip(strip_length) for _ in range(num_strips)]
+        # one contiguous [strip][led][r, g, b, a] buffer, each Strip works on a view of its row
+        self.frame = np.full((num_strips, strip_length, 4), 255, dtype=np.float32)
+        self.strips = [Strip(strip_length, buffer=self.frame[i]) for i in range(num_strips)]
         self.wled_addr = wled_addr
         self.port = port
+        self.ring = None # FrameRing every rendered frame is published to for out of process viewers
+        self.errors = 0 # strips reset to idle because their effect or color raised
     
-    # update strips
-    def update(self):
-        for strip in self.strips:
-            strip.update()
+    # update strips, every strip renders against the same frame timestamp t
+    def update(self, t=None):
+        if t is None:
+            t = now()
+        start = perf_counter()
+        for i, strip in enumerate(self.strips):
+            try:
+                strip.update(t)
+            except Exception:
+                # a bad effect / args from a button config only takes its own strip back to idle
+                print(f"Strip {i}: effect {strip.effectFunc!r} {strip.effect_args} / "
+                      f"color {strip.colorFunc!r} {strip.color_args} failed, reset to idle")
+                traceback.print_exc()
+                strip.reset()
+                self.errors += 1
+        if telemetry.enabled:
+            telemetry.record("render", perf_counter() - start)
+            telemetry.record("color", sum(strip.color_time for strip in self.strips))
+            telemetry.record("effect", sum(strip.effect_time for strip in self.strips))
+        if self.ring is not None:
+            self.ring.write(self.frame)
+
+    def rgb(self):
+        '''
+        alpha premultiplied (num_strips, strip_length, 3) uint8 array of the whole frame
+        '''
+        return premultiply(self.frame)
         
     def setStrip(self, 
                 index=0, 
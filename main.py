@@ -1,146 +1,254 @@
-import ast
 import time
-from launchpad import Launchpad
-from launchpad_gui import LaunchpadGUI
+import argparse
+import os
+import sys
+import subprocess
+import traceback
+from collections import ChainMap
 from lights import Lights
-import mido
-import asyncio
 
-from fx.mono.effects import *
-from fx.mono.colors import *
-from fx.poly.effects import *
-from fx.poly.colors import *
+from fx import registry
 from network import *
+from scheduler import FrameScheduler
+from clock import now
+from engine import Engine
+from commands import ButtonGrid
+from control import ControlServer, CONTROL_PORT
+import telemetry
 
 # +=======+ Config +=======+ #
 
-VIS = False # display pygame visualizer of lights
+VIS = False # display pygame visualizer of lights, in its own process (more viewers: python stripvis.py)
 SEND = True # send udp / http packets to WLED servers
 num_strips = 6 # total number of led strips
 fps = 60.0
+ui_fps = 30.0 # launchpad leds, gui and visualizer refresh rate, independent of the light fps
+sync_lead = 0.004 # render frames this far ahead and send to all WLED servers together at the frame time, 0 sends as soon as rendered
+stats_interval = 10.0 # seconds between frame rate / stage timing reports, 0 to disable
 bpm = 120
 # wled_addr = {"192.168.0.101": [0, 1, 2], "192.168.0.100": [3, 4, 5]} # mapping strips to wled servers (0 indexed)
 wled_addr = {"192.168.0.100": [3, 4, 5]}
 
 # +========================+ #
 
-frame_duration = 1.0 / fps
+http_client = None # HTTPClient, created on the first http button press
 
 
-def handle_http(input_str):
-    for ip in wled_addr.keys():
-        asyncio.run(triggerLED(input_str, ip))
-        # TODO: handle http requests (take a look it you can set the lights to follow WLED presets through UDP messaages)
+def handle_http(message):
+    '''
+    send a compiled http button message to every WLED server without waiting, returns a future per server
+    '''
+    # TODO: handle http requests (take a look it you can set the lights to follow WLED presets through UDP messaages)
+    global http_client
+    if not SEND:
+        return []
+    if http_client is None:
+        http_client = HTTPClient() # pulls in aiohttp, so only when a button needs it
+    return http_client.trigger(message, wled_addr.keys())
 
-# [[setStrip inputs], ..., [setStrip inputs]]
-def handle_udp(input_string, lights):
-    """Placeholder for UDP logic."""
+_fx_ns = registry.namespace()
 
-    data = eval(input_string)
+def _press_ns(t):
+    # everything a button expression can see (commands.BUTTON_NAMES + the fx), lights is added on the engine thread
+    return ChainMap({"bpm": bpm, "now": t, "add_to_bpm": add_to_bpm}, _fx_ns)
 
-    # check if the result is a list
-    if not isinstance(data, list):
-        raise ValueError("Input is not a list structure.")
+def _eval_on_lights(lights, expr, ns):
+    # runs on the engine thread, button code refers to the Lights object as `lights`
+    expr(ns.new_child({"lights": lights}))
 
-    # check if it is 2D (all elements are lists)
-    if not all(isinstance(item, list) for item in data):
-        raise ValueError("Input is a 1D list, but a 2D list is required.")
-
-    for command in data:
-        index, ef, ea, cf, ca = command[0:5]
-        misc = command[5] if len(command) > 5 else None
-        if type(ef) is type(""):
-            ef = eval(ef)
-        if type(cf) is type(""):
-            cf = eval(cf)
-        lights.setStrip(index, ef, ea, cf, ca)
-        if misc is not None:
-            eval(misc)
+def handle_udp(strips, engine, t=None):
+    """Queue the setStrip calls of a compiled button on the engine, t is the press time (clock.now())."""
+    ns = _press_ns(now() if t is None else t)
+    for command in strips:
+        engine.submit(Lights.setStrip, *command.resolve(ns))
+        if command.misc is not None:
+            engine.submit(_eval_on_lights, command.misc, ns)
 
 def add_to_bpm(amount):
     global bpm
     bpm += amount
 
-def main():
-    lp = None
+def press(buttons, engine, row, col, t=None):
+    """Run the button at row, col of a ButtonGrid (Launchpad pad hit or remote press) pressed at time t."""
+    if not buttons.grid[row][col][1]:
+        return
+    command = buttons.commands[row][col]
+    if t is None:
+        t = now()
+
+    if command.http is not None:
+        handle_http(command.http)
+
+    if command.strips:
+        handle_udp(command.strips, engine, t)
+
+    if command.func is not None:
+        engine.submit(_eval_on_lights, command.func, _press_ns(t))
+
+CONFIG_DIR = "button_configs"
+
+def config_path(name):
+    """Path of a config in CONFIG_DIR by name, ValueError for anything that isn't one of them."""
+    if not isinstance(name, str) or name not in [f[:-5] for f in os.listdir(CONFIG_DIR) if f.endswith(".json")]:
+        raise ValueError(f"unknown config {name!r}")
+    return os.path.join(CONFIG_DIR, f"{name}.json")
+
+def _valid_bpm(value):
+    value = float(value)
+    if not 0 < value < float("inf"):
+        raise ValueError(f"bpm must be > 0, got {value!r}")
+    return value
+
+def handle_control(msg, buttons, engine):
+    """Answer one control socket request, returns the reply dict."""
+    global bpm
+    cmd = msg.get("cmd")
+    if cmd == "press":
+        row, col = msg["button"]
+        if not (isinstance(row, int) and isinstance(col, int) and 0 <= row < 9 and 0 <= col < 9):
+            raise ValueError(f"no button {row!r}, {col!r}")
+        press(buttons, engine, row, col)
+    elif cmd == "bpm":
+        if "value" in msg:
+            bpm = _valid_bpm(msg["value"])
+        else:
+            bpm = _valid_bpm(bpm + float(msg.get("add", 0)))
+    elif cmd == "load":
+        buttons.load_grid_from_file(config_path(msg["config"]))
+    elif cmd == "stats":
+        return {"ok": True, "stages": telemetry.stats()}
+    elif cmd != "status":
+        return {"ok": False, "error": f"unknown cmd {cmd!r}"}
+    mean, worst = engine.scheduler.jitter()
+    alive = engine.alive()
+    return {"ok": True, "bpm": bpm, "fps": engine.scheduler.fps() if alive else 0.0, "jitter_avg": mean, "jitter_max": worst,
+            "engine_alive": alive, "engine_errors": engine.errors, "strip_errors": engine.lights.errors,
+            "dropped": engine.scheduler.dropped, "config": buttons.file_path,
+            "nodes": engine.output.stats() if engine.output is not None else {},
+            "sync_late": engine.output.late if engine.output is not None else 0}
+
+def find_launchpad():
+    import mido
+    from launchpad import Launchpad
     try:
         for mid in mido.get_input_names():
             if "Launch" in mid:
-                lp = Launchpad()
+                return Launchpad()
     except (IOError, OSError, Exception):
         pass
-        
-    if lp is None:
-        print("Launchpad not connected — GUI config editor only.")
+    return None
 
-    gui = LaunchpadGUI(lp, num_strips=num_strips)
+def main():
+    parser = argparse.ArgumentParser(description="Drive WLED strips from a Launchpad")
+    parser.add_argument("--headless", action="store_true", help="run as a daemon without the GUI editor, control surfaces attach over the control socket")
+    parser.add_argument("--config", help="button config to load at startup (name in button_configs/)")
+    parser.add_argument("--control-port", type=int, default=CONTROL_PORT, help="local control socket port, 0 to disable")
+    args = parser.parse_args()
 
+    # lights first, so output starts before midi and the gui are up
     lights = Lights(num_strips=num_strips, wled_addr=wled_addr)
+    output = UDPOutput.fromLights(lights, fps=fps, lead=sync_lead) if SEND else None
 
     # default start effect for lights
     for i in range(num_strips):
-        lights.setStrip(i, idleEffect, [], None, None)
+        lights.setStrip(i, registry.get("idleEffect").func, [], None, None)
     
+    engine = Engine(lights, fps, output)
+    engine.start()
+
+    lp = find_launchpad()
+    if lp is None:
+        print("Launchpad not connected" + (" — GUI config editor only." if not args.headless else "."))
+
+    # button configs live on the pad, or on a plain grid for remote presses when there is none
+    buttons = lp if lp is not None else ButtonGrid()
+    if args.config:
+        buttons.load_grid_from_file(config_path(args.config))
+
+    control = ControlServer(args.control_port) if args.control_port else None
+
+    gui = None
+    if not args.headless:
+        from launchpad_gui import LaunchpadGUI
+        gui = LaunchpadGUI(buttons, num_strips=num_strips)
+
     print("Main loop started. Press Ctrl+C to exit.")
 
-    next_frame_time = time.perf_counter()
+    ui = FrameScheduler(ui_fps)
+    # midi and control requests arrive on other threads, they wake the main loop right away
+    # instead of it polling for them, an idle daemon only wakes at the ui rate
+    if lp is not None:
+        lp.on_input = ui.wake
+    if control is not None:
+        control.on_input = ui.wake
+    next_report = time.perf_counter() + stats_interval
 
+    viewer = None
     if VIS:
-        from stripvis import StripVisualizer
-        svs = StripVisualizer(30, 600, lights)
+        # frames go to shared memory, the pygame window runs in its own process and can't stall the lights
+        from framering import FrameRing
+        lights.ring = FrameRing.create(lights.num_strips, lights.strip_length)
+        viewer = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stripvis.py"),
+                                   "--ring", lights.ring.name, "--fps", str(ui_fps)])
 
     # +=====+ Main Loop +=====+ #
     try:
         while True:
-            # time for frame rate management
-            current_time = time.perf_counter()
+            # lights render on the engine thread, this loop only handles input and ui
+            ui_due = ui.wait()
 
             # handle launchpad if its connected
             if lp is not None:
-                # get midi inputs from launchpad
-                midi_data = lp.get_midi()
-                
                 # loop through and process midi input messages
-                for msg in midi_data:
-                    row, col = msg["button"]
-                    is_pressed = msg["on"]
-                    
-                    if is_pressed:
-                        btn_config = lp.grid[row][col]
-                        color, active, http_val, udp_val, func = btn_config
-                    
-                        if active:
-                            if http_val is not None:
-                                handle_http(http_val)
-                            
-                            if udp_val is not None:
-                                handle_udp(udp_val, lights)
-                            
-                            if func is not None:
-                                eval(func)
-
-            # update the launchpad and gui
-            if lp is not None: lp.update()
-            gui.sync(bpm=bpm)
-
-            # update lights
-            if current_time >= next_frame_time:
-                lights.update()
-                if VIS:
-                    svs.update()
-                if SEND:
-                    for ip, strips in lights.wled_addr.items():
-                        sendUDP(ip, lights.port, lightToBytes(lights, strips))
-                next_frame_time += frame_duration
-            
-            # Small sleep to prevent high CPU usage
-            time.sleep(0.01)
-            
+                with telemetry.timed("midi"):
+                    for msg in lp.get_midi():
+                        if msg["on"]:
+                            row, col = msg["button"]
+                            try:
+                                press(lp, engine, row, col, msg["time"])
+                            except Exception:
+                                # a button whose args fail at press time (e.g. 60 / (bpm - 120)) must not stop the loop
+                                print(f"Button {row}, {col} failed:")
+                                traceback.print_exc()
+
+            # requests from attached control surfaces
+            if control is not None:
+                for msg, addr in control.poll():
+                    try:
+                        reply = handle_control(msg, buttons, engine)
+                    except Exception as e:
+                        # a bad request gets an error reply, it must never stop the loop (and the lights with it)
+                        reply = {"ok": False, "error": repr(e)}
+                    control.reply(addr, reply)
+
+            # update the launchpad, gui and visualizer at the ui rate
+            if ui_due:
+                ui.frame()
+                if lp is not None:
+                    with telemetry.timed("launchpad"):
+                        lp.update()
+                if gui is not None:
+                    with telemetry.timed("gui"):
+                        gui.sync(bpm=bpm)
+
+            if stats_interval and time.perf_counter() >= next_report:
+                print(engine.scheduler.report())
+                if output is not None: print(output.report())
+                print(telemetry.report())
+                next_report += stats_interval
+
     except KeyboardInterrupt:
         print("Shutting down...")
     finally:
+        engine.stop()
         if lp is not None: lp.close_ports()
-        gui.destroy()
+        if control is not None: control.close()
+        if output is not None: output.close()
+        if http_client is not None: http_client.close()
+        if gui is not None: gui.destroy()
+        if viewer is not None:
+            viewer.terminate()
+            lights.ring.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
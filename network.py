@@ -1,52 +1,423 @@
 import socket
 import time
-import aiohttp
+import ast
+import json
+import threading
+import asyncio
+from collections import deque
+import numpy as np
+from clock import now, toMonotonic
+from strip import premultiply
+import telemetry
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+def _tuneSocket(sock):
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY, 6)
+    except:
+        pass
 
-try:
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY, 6)
-except:
-    pass
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, 0x10)
 
-sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, 0x10)
+sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+_tuneSocket(sock)
 
 
 def sendUDP(ip_addr, port, udp_bytes):
     '''
-    Send udp packets to
+    Send a single udp packet with the shared blocking socket (one-off use, the render loop uses UDPOutput)
     '''
     sock.sendto(udp_bytes, (ip_addr, port))
-    socket.gethostbyname('')
 
-def lightToBytes(lights, strips):
+_loop = None
+_loop_lock = threading.Lock()
+
+def getLoop():
+    '''
+    shared background event loop for all network io, started on first use
+    '''
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="network", daemon=True).start()
+    return _loop
+
+# WLED realtime protocols
+DRGB = 2
+DNRGB = 4
+DRGB_MAX_LEDS = 490 # larger frames have to be split into DNRGB chunks
+
+def bufferCount(lead, fps):
+    '''
+    packet sets an encoder needs so a set is never rewritten while queued: the frames
+    a synced lead holds on the loop, plus the one being encoded and one going out
+    '''
+    return int(lead * fps) + 2
+
+class PacketSet:
     '''
-    takes in a Lights object and an array with indexes of strips, converts rgb values to sendable udp data
+    One buffer of FrameEncoder packets. in_flight is set by encode() when it hands the
+    packets out and cleared on the network loop once they went to the socket (or were dropped).
     '''
-    leds = []
-    for s in range(lights.num_strips):
-        if s in strips:
-            leds += lights.strips[s].rgb()
+    def __init__(self, plan):
+        self.packets = [] # packet memoryviews
+        self.payloads = [] # their rgb payloads as (leds, 3) arrays
+        for lo, hi, header in plan:
+            packet = bytearray(header) + bytearray((hi - lo) * 3)
+            self.packets.append(memoryview(packet))
+            self.payloads.append(np.frombuffer(packet, dtype=np.uint8, offset=len(header)).reshape(hi - lo, 3))
+        self.in_flight = False
 
-    udp_bytes = bytearray()
+class FrameEncoder:
+    '''
+    Encodes the strips owned by one WLED target into reusable UDP packets.
+    Up to DRGB_MAX_LEDS this is a single DRGB packet, beyond that the frame is
+    split into MTU sized DNRGB packets with a start index header.
+    Every buffer and the chunk plan are set up once, encode() only writes into them.
+    The packets are multi-buffered: each encode() fills the next of `buffers` packet
+    sets, so sets handed to the network loop aren't rewritten while they wait to go out
+    (see bufferCount). If the next set is still in flight anyway, it is left to the loop
+    and replaced by a freshly allocated one, counted in self.copies.
+    '''
+    def __init__(self, lights, strips, timeout=1, mtu=1500, buffers=2):
+        self.lights = lights
+        # like lightToBytes always did, strips the Lights object doesn't have are skipped
+        self.strips = sorted(s for s in strips if 0 <= s < lights.num_strips)
+        if len(self.strips) != len(strips):
+            missing = sorted(set(strips) - set(self.strips))
+            print(f"Strips {missing} are not in Lights (strips 0-{lights.num_strips - 1}) and are not sent")
+        self.num_leds = len(self.strips) * lights.strip_length
 
-    udp_bytes.append(2) # DRGB
-    udp_bytes.append(1) # leave realtime mode
+        # a contiguous run of strips is just a view of the frame, anything else is gathered into scratch
+        first = self.strips[0] if self.strips else 0
+        if self.strips == list(range(first, first + len(self.strips))):
+            self._index = None
+            self._gather = lights.frame[first:first + len(self.strips)]
+        else:
+            self._index = np.array(self.strips)
+            self._gather = np.empty((len(self.strips), lights.strip_length, 4), dtype=lights.frame.dtype)
+        self._rgba = self._gather.reshape(self.num_leds, 4)
+        self._work = np.empty((self.num_leds, 3), dtype=np.float32)
+        self._rgb = np.empty((self.num_leds, 3), dtype=np.uint8)
 
-    for i in range(len(leds)):
-        # Bytes -> [...][Index, R, G, B][...]
-        for val in leds[i]:
-            udp_bytes.append(val)
+        # chunk plan: [(first led, last led + 1, header bytes)]
+        if self.num_leds == 0:
+            plan = []
+        elif self.num_leds <= DRGB_MAX_LEDS:
+            plan = [(0, self.num_leds, bytes([DRGB, timeout]))]
+        else:
+            chunk = (mtu - 28 - 4) // 3 # ip + udp headers, DNRGB header
+            plan = [(i, min(i + chunk, self.num_leds), bytes([DNRGB, timeout, i >> 8, i & 0xFF]))
+                    for i in range(0, self.num_leds, chunk)]
 
-    return udp_bytes
+        # Bytes -> [header][...][R, G, B][...]
+        self._plan = plan
+        self._sets = [PacketSet(plan) for _ in range(buffers)]
+        self._chunks = [(self._rgb[lo:hi], np.empty((hi - lo, 3), dtype=bool)) for lo, hi, _ in plan] # (rgb slice, changed mask) per packet
+        self._current = 0
+        self.buffers = buffers
+        self.copies = 0 # encodes that found their set still in flight
+        self.set = self._sets[0] # PacketSet of the last encode()
+        self.packets = self.set.packets
+        self.dirty = [True] * len(plan) # per packet, whether the last encode() changed its contents
 
-async def triggerLED(message_str, ip):
-    ip_url = f"http://{ip}/json/state"
-    message = eval(message_str)
+    def encode(self):
+        '''
+        premultiply alpha into the packet buffers, returns the list of packet memoryviews
+        and flags the packets whose contents changed in self.dirty. The set stays in
+        flight until self.set.in_flight is cleared by whoever sends it
+        '''
+        if self._index is not None:
+            np.take(self.lights.frame, self._index, axis=0, out=self._gather)
+        premultiply(self._rgba, self._rgb, self._work)
+        previous = self._sets[self._current].payloads
+        self._current = (self._current + 1) % len(self._sets)
+        current = self._sets[self._current]
+        if current.in_flight:
+            # still queued on the network loop, it keeps the old buffers and this frame gets new ones
+            current = self._sets[self._current] = PacketSet(self._plan)
+            self.copies += 1
+        for i, (rgb, mask) in enumerate(self._chunks):
+            np.not_equal(previous[i], rgb, out=mask)
+            self.dirty[i] = bool(mask.any())
+            np.copyto(current.payloads[i], rgb)
+        current.in_flight = True
+        self.set = current
+        self.packets = current.packets
+        return self.packets
+
+class WLEDTarget:
+    '''
+    Send stage for one WLED controller. Only packets whose contents changed are sent,
+    plus a full keyframe every keepalive seconds so the controller never hits its
+    realtime timeout during a static look.
+    '''
+    def __init__(self, ip, port, lights, strips, timeout=1, keepalive=None, buffers=2):
+        self.ip = ip
+        self.port = port
+        self.encoder = FrameEncoder(lights, strips, timeout=timeout, buffers=buffers)
+        self.keepalive = timeout / 2 if keepalive is None else keepalive
+        self.last_keyframe = None
+
+    def frame(self, t):
+        '''
+        encode the current frame, returns the packets that need to go out at frame time t
+        '''
+        packets = self.encoder.encode()
+        if self.last_keyframe is None or t - self.last_keyframe >= self.keepalive:
+            self.last_keyframe = t
+            return packets
+        return [packet for packet, dirty in zip(packets, self.encoder.dirty) if dirty]
+
+class NodeStats:
+    def __init__(self, window=240):
+        self.packets = 0
+        self.bytes = 0
+        self.errors = 0 # socket errors, e.g. ICMP port unreachable from a node that is down
+        self.dropped = 0 # packets not sent because the node's send buffer was backed up
+        self._latency = deque(maxlen=window) # frame handoff (or burst start when synced) -> last sendto, seconds
+        self._skew = deque(maxlen=window) # last sendto - frame target time, synced output only
+
+    def latency(self):
+        '''
+        (mean, max) send latency over the window in seconds
+        '''
+        if not self._latency:
+            return 0.0, 0.0
+        return sum(self._latency) / len(self._latency), max(self._latency)
+
+    def skew(self):
+        '''
+        (mean, max) offset of the node's sends from the frame target time in seconds
+        '''
+        if not self._skew:
+            return 0.0, 0.0
+        return sum(self._skew) / len(self._skew), max(self._skew, key=abs)
+
+    def asdict(self, copies=0):
+        mean, worst = self.latency()
+        skew_mean, skew_worst = self.skew()
+        return {"packets": self.packets, "bytes": self.bytes, "errors": self.errors,
+                "dropped": self.dropped, "copies": copies, "latency_avg": mean, "latency_max": worst,
+                "skew_avg": skew_mean, "skew_max": skew_worst}
+
+class NodeWorker(asyncio.DatagramProtocol):
+    '''
+    Send worker for one WLED node: its own connected, non-blocking datagram socket
+    on the network loop, plus per-node stats.
+    '''
+    def __init__(self, target, max_buffer):
+        self.target = target
+        self.ip = target.ip
+        self.max_buffer = max_buffer
+        self.transport = None
+        self.error = None # last connect error, logged once until it changes
+        self.stats = NodeStats()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def error_received(self, exc):
+        self.stats.errors += 1
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def send(self, packets, submitted):
+        '''
+        returns True if the packets were handed to the socket
+        '''
+        transport = self.transport
+        if transport is None or transport.get_write_buffer_size() > self.max_buffer:
+            self.stats.dropped += len(packets)
+            return False
+        for packet in packets:
+            transport.sendto(packet)
+            self.stats.bytes += len(packet)
+        self.stats.packets += len(packets)
+        self.stats._latency.append(time.perf_counter() - submitted)
+        return True
+
+class UDPOutput:
+    '''
+    Sharded, non-blocking output to every WLED node. Each node has a WLEDTarget (its
+    precomputed strip slice and encoder) and a NodeWorker (pre-resolved, connected
+    endpoint and stats). Nodes that can't be reached yet (a show box booting before
+    its Wi-Fi is up) or whose endpoint closed are reconnected every retry seconds,
+    their frames count as dropped meanwhile. send() encodes, snapshots the packets and hands the whole
+    frame to the network loop in one call, so the render loop never waits on a
+    socket and a node whose send buffer backs up drops frames instead of queueing them.
+
+    With lead > 0 output is synchronized: the engine renders each frame lead seconds
+    ahead of its timestamp, and the packets for every node are held on the loop and
+    sent as one burst at that timestamp, so strips on different nodes change together.
+    Per-node skew from the target time and the spread of each burst are recorded.
+    Given the frame rate, every encoder is checked to have the bufferCount(lead, fps)
+    packet sets that lead keeps on the loop.
+    '''
+    def __init__(self, targets, max_buffer=64 * 1024, lead=0.0, window=240, retry=1.0, fps=None):
+        if fps is not None:
+            needed = bufferCount(lead, fps)
+            for target in targets:
+                if target.encoder.buffers < needed:
+                    raise ValueError(f"{target.ip}: a {lead}s lead at {fps} fps needs {needed} packet buffers, "
+                                     f"the encoder has {target.encoder.buffers}")
+        self.loop = getLoop()
+        self.targets = targets
+        self.max_buffer = max_buffer
+        self.retry = retry
+        self._closed = False
+        self._retry_handle = None
+        self.lead = lead
+        self.late = 0 # synced frames that reached the loop after their target time
+        self._spread = deque(maxlen=window) # first -> last node send within a burst, seconds
+        self.workers = asyncio.run_coroutine_threadsafe(self._connect(), self.loop).result()
+
+    @classmethod
+    def fromLights(cls, lights, fps=None, **kwargs):
+        '''
+        one node per lights.wled_addr entry, with enough packet buffers for the lead at fps
+        '''
+        buffers = bufferCount(kwargs.get("lead", 0.0), fps) if fps is not None else 2
+        targets = [WLEDTarget(ip, lights.port, lights, strips, buffers=buffers) for ip, strips in lights.wled_addr.items()]
+        return cls(targets, fps=fps, **kwargs)
+
+    async def _connect(self):
+        workers = [NodeWorker(target, self.max_buffer) for target in self.targets]
+        for worker in workers:
+            await self._connectWorker(worker)
+        self._retry_handle = self.loop.call_later(self.retry, self._scheduleRetry)
+        return workers
+
+    async def _connectWorker(self, worker):
+        target = worker.target
+        try:
+            addr = (await self.loop.getaddrinfo(target.ip, target.port, family=socket.AF_INET, type=socket.SOCK_DGRAM))[0][4]
+            transport, _ = await self.loop.create_datagram_endpoint(lambda: worker, remote_addr=addr)
+            _tuneSocket(transport.get_extra_info("socket"))
+        except OSError as e:
+            if str(e) != worker.error:
+                print(f"Could not open UDP endpoint for {target.ip}, retrying every {self.retry}s: {e}")
+            worker.error = str(e)
+            return
+        if worker.error is not None:
+            print(f"UDP endpoint for {target.ip} connected")
+        worker.error = None
+
+    def _scheduleRetry(self):
+        if not self._closed:
+            self.loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        for worker in self.workers:
+            if worker.transport is None and not self._closed:
+                await self._connectWorker(worker)
+        if not self._closed:
+            self._retry_handle = self.loop.call_later(self.retry, self._scheduleRetry)
+
+    def send(self, t):
+        '''
+        encode every node at frame time t and queue the packets on the network loop,
+        to go out immediately or, when synced, at time t
+        '''
+        with telemetry.timed("encode"):
+            batch = self.encode(t)
+        self.submit(batch, t)
+
+    def encode(self, t):
+        '''
+        encode every node at frame time t, returns [(worker, packets, packet set)] ready for submit()
+        '''
+        # no copy, the sets stay in flight until _flush / _burst is done with them
+        return [(worker, worker.target.frame(t), worker.target.encoder.set) for worker in self.workers]
+
+    def submit(self, batch, t):
+        '''
+        hand an encoded batch to the network loop
+        '''
+        if self.lead > 0:
+            self.loop.call_soon_threadsafe(self._schedule, batch, t)
+        else:
+            self.loop.call_soon_threadsafe(self._flush, batch, time.perf_counter())
+
+    def _flush(self, batch, submitted):
+        with telemetry.timed("send"):
+            for worker, packets, packet_set in batch:
+                if packets:
+                    worker.send(packets, submitted)
+                packet_set.in_flight = False
+
+    def _schedule(self, batch, t):
+        if now() >= t:
+            self.late += 1
+            self._burst(batch, t)
+        else:
+            self.loop.call_at(toMonotonic(t), self._burst, batch, t)
+
+    def _burst(self, batch, t):
+        start = time.perf_counter()
+        last = start
+        for worker, packets, packet_set in batch:
+            if packets and worker.send(packets, start):
+                worker.stats._skew.append(now() - t)
+                last = time.perf_counter()
+            packet_set.in_flight = False
+        self._spread.append(last - start)
+        if telemetry.enabled:
+            telemetry.record("send", time.perf_counter() - start)
+
+    def spread(self):
+        '''
+        (mean, max) time between the first and last node send of a synced burst in seconds
+        '''
+        if not self._spread:
+            return 0.0, 0.0
+        return sum(self._spread) / len(self._spread), max(self._spread)
+
+    def stats(self):
+        '''
+        {ip: stats dict} for every node
+        '''
+        return {worker.ip: worker.stats.asdict(worker.target.encoder.copies) for worker in self.workers}
+
+    def report(self):
+        lines = []
+        for ip, st in self.stats().items():
+            line = (f"{ip}: {st['packets']} pkts {st['bytes'] / 1e6:.1f}MB | latency avg {st['latency_avg'] * 1000:.2f}ms"
+                    f" max {st['latency_max'] * 1000:.2f}ms | errors {st['errors']} dropped {st['dropped']} copies {st['copies']}")
+            if self.lead > 0:
+                line += f" | skew avg {st['skew_avg'] * 1000:.2f}ms max {st['skew_max'] * 1000:.2f}ms"
+            lines.append(line)
+        if self.lead > 0:
+            mean, worst = self.spread()
+            lines.append(f"sync: burst spread avg {mean * 1000:.3f}ms max {worst * 1000:.3f}ms | late {self.late}")
+        return "\n".join(lines)
+
+    def close(self):
+        self._closed = True
+        if self._retry_handle is not None:
+            self.loop.call_soon_threadsafe(self._retry_handle.cancel)
+        for worker in self.workers:
+            if worker.transport is not None:
+                self.loop.call_soon_threadsafe(worker.transport.close)
+
+def lightToBytes(lights, strips):
+    '''
+    takes in a Lights object and an array with indexes of strips, converts rgb values to a list of sendable udp packets
+    '''
+    return [bytearray(packet) for packet in FrameEncoder(lights, strips).encode()]
+
+def buildMessage(message_str):
+    '''
+    parse an http button string into a WLED /json/state message with our defaults applied, None if empty
+    '''
+    message = ast.literal_eval(message_str)
     if message == "":
         print("No function")
-        return False
-    
+        return None
+    if not isinstance(message, dict):
+        raise ValueError(f"http message must be a dict, got {message!r}")
+
     # Defaults -----
 
     message["transition"] = 1
@@ -78,20 +449,61 @@ async def triggerLED(message_str, ip):
             message["seg"] = newMessage
     # --------------
 
-    print(message)
-        
-    print("Sending WLED request...")
+    return message
+
+async def postState(session, ip, data):
+    '''
+    post an encoded json message to a WLED controller, returns True on success
+    '''
+    ip_url = f"http://{ip}/json/state"
     headers = {'Content-Type': 'application/json'}
+    try:
+        async with session.post(ip_url, headers=headers, data=data) as response:
+            if response.status == 200:
+                print(f"Device {ip} triggered successfully.")
+                return True
+            else:
+                text = await response.text()
+                print(f"Failed to trigger on {ip}. Status code: {response.status}, Response: {text}")
+                return False
+    except Exception as e:
+        print(f"<! Error during request to {ip}: {e!r} !>")
+        return False
+
+async def triggerLED(message_str, ip):
+    message = buildMessage(message_str)
+    if message is None:
+        return False
+
+    import aiohttp
+
+    print("Sending WLED request...")
+    print(message)
     async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(ip_url, headers=headers, data=json.dumps(message)) as response:
-                if response.status == 200:
-                    print("Device triggered successfully.")
-                    return True
-                else:
-                    text = await response.text()
-                    print(f"Failed to trigger on device. Status code: {response.status}, Response: {text}")
-                    return False
-        except Exception as e:
-            print(f"<! Error during request !>")
-            return False
\ No newline at end of file
+        return await postState(session, ip, json.dumps(message))
+
+class HTTPClient:
+    '''
+    Pooled keep-alive aiohttp session on the network loop for WLED JSON API calls.
+    trigger() returns right away with one concurrent.futures.Future per controller.
+    '''
+    def __init__(self, timeout=2.0):
+        # deferred, it is slow to import and only needed once a button uses http. imported here on
+        # the caller's thread, on the network loop it would stall UDP output for the whole import
+        import aiohttp
+        self.loop = getLoop()
+        self.session = asyncio.run_coroutine_threadsafe(self._open(aiohttp, timeout), self.loop).result()
+
+    async def _open(self, aiohttp, timeout):
+        connector = aiohttp.TCPConnector(limit_per_host=2, keepalive_timeout=60)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+    def trigger(self, message, ips):
+        '''
+        post one buildMessage() message (ButtonCommand.http) to every ip concurrently
+        '''
+        data = json.dumps(message)
+        return [asyncio.run_coroutine_threadsafe(postState(self.session, ip, data), self.loop) for ip in ips]
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
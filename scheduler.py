@@ -0,0 +1,71 @@
+# Deadline driven frame scheduling for the main loop
+import time
+import threading
+from collections import deque
+
+class FrameScheduler:
+    '''
+    Keeps frames on a fixed grid of deadlines. wait() sleeps until the next deadline
+    (or an earlier timeout / wake() for input). A late frame is rendered once and the
+    grid skips ahead, so a stall drops frames instead of bursting to catch up.
+    '''
+    def __init__(self, fps, window=240):
+        self.frame_duration = 1.0 / fps
+        self.next_deadline = time.perf_counter()
+        self.frames = 0
+        self.dropped = 0
+        self._wake = threading.Event()
+        self._starts = deque(maxlen=window) # frame start times
+        self._lateness = deque(maxlen=window) # start time - deadline, per frame
+
+    def wake(self):
+        '''
+        interrupt a pending wait(), e.g. when an input event arrives
+        '''
+        self._wake.set()
+
+    def due(self):
+        return time.perf_counter() >= self.next_deadline
+
+    def wait(self, timeout=None):
+        '''
+        sleep until the next frame is due, at most timeout seconds or until wake().
+        returns True if a frame is due
+        '''
+        delay = self.next_deadline - time.perf_counter()
+        if timeout is not None:
+            delay = min(delay, timeout)
+        if delay > 0:
+            self._wake.wait(delay)
+        self._wake.clear()
+        return self.due()
+
+    def frame(self):
+        '''
+        mark the start of a due frame and move to the next deadline
+        '''
+        start = time.perf_counter()
+        late = start - self.next_deadline
+        missed = int(late // self.frame_duration) if late > 0 else 0
+        self.dropped += missed
+        self._lateness.append(late - missed * self.frame_duration)
+        self._starts.append(start)
+        self.next_deadline += (missed + 1) * self.frame_duration
+        self.frames += 1
+
+    def fps(self):
+        if len(self._starts) < 2:
+            return 0.0
+        return (len(self._starts) - 1) / (self._starts[-1] - self._starts[0])
+
+    def jitter(self):
+        '''
+        (mean, max) lateness of frame starts against their deadlines in seconds
+        '''
+        if not self._lateness:
+            return 0.0, 0.0
+        return sum(self._lateness) / len(self._lateness), max(self._lateness)
+
+    def report(self):
+        mean, worst = self.jitter()
+        return f"fps {self.fps():.1f} | jitter avg {mean * 1000:.2f}ms max {worst * 1000:.2f}ms | dropped {self.dropped}"
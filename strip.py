@@ -1,30 +1,92 @@
 from fx.mono.effects import *
 from fx.mono.colors import *
 from functools import partial
+from time import perf_counter
+import numpy as np
+import telemetry
 
 class Strip:
-    def __init__(self, length, colorFunc = idleColor, effectFunc = chase):
-        self.strip = [[255, 255, 255, 255] for i in range(length)]
+    def __init__(self, length, colorFunc = idleColor, effectFunc = chase, buffer = None):
+        # strip is a (length, 4) float32 [r, g, b, a] array, usually a view into Lights.frame
+        if buffer is None:
+            buffer = np.full((length, 4), 255, dtype=np.float32)
+        self.strip = buffer
         self.effectFunc = effectFunc
         self.colorFunc = colorFunc
         self.color_args = []
         self.effect_args = []
+        self.color_time = 0.0 # duration of the last update's color / effect pass, with telemetry on
+        self.effect_time = 0.0
         
-    def _applyEffect(self):
-        self.strip = self.effectFunc(self.strip, *self.effect_args)
+    # telemetry stage names are set with the funcs, not built every frame
+    @property
+    def effectFunc(self):
+        return self._effectFunc
 
-    def _applyColor(self):
-        self.strip = self.colorFunc(self.strip, *self.color_args)
+    @effectFunc.setter
+    def effectFunc(self, func):
+        self._effectFunc = func
+        self.effect_stage = "effect:" + getattr(func, "__name__", repr(func))
 
-    def update(self):
-        self._applyColor()
-        self._applyEffect()
+    @property
+    def colorFunc(self):
+        return self._colorFunc
 
-    def rgb(self):   
-        tempStrip = [[0,0,0] for i in range(len(self.strip))]
-        for i in range(len(tempStrip)):
-            for j in range(3):
-                tempStrip[i][j] = int(self.strip[i][j] * self.strip[i][3] / 255)
+    @colorFunc.setter
+    def colorFunc(self, func):
+        self._colorFunc = func
+        self.color_stage = "color:" + getattr(func, "__name__", repr(func))
 
-        return tempStrip
+    def _applyEffect(self, t):
+        self._store(self.effectFunc(self.strip, *self.effect_args, t=t))
 
+    def _applyColor(self, t):
+        self._store(self.colorFunc(self.strip, *self.color_args, t=t))
+
+    def _store(self, result):
+        # keep self.strip pointing at the shared buffer even if a func returns a new array
+        if result is not None and result is not self.strip:
+            self.strip[...] = result
+
+    def reset(self):
+        '''
+        back to idle, e.g. after the effect or color raised
+        '''
+        self.effectFunc, self.effect_args = idleEffect, []
+        self.colorFunc, self.color_args = idleColor, []
+
+    def update(self, t):
+        if not telemetry.enabled:
+            self._applyColor(t)
+            self._applyEffect(t)
+            return
+        start = perf_counter()
+        self._applyColor(t)
+        mid = perf_counter()
+        self._applyEffect(t)
+        self.color_time = mid - start
+        self.effect_time = perf_counter() - mid
+        telemetry.record(self.color_stage, self.color_time)
+        telemetry.record(self.effect_stage, self.effect_time)
+
+    def rgb(self):
+        '''
+        alpha premultiplied rgb values as a (length, 3) uint8 array
+        '''
+        return premultiply(self.strip)
+
+
+def premultiply(rgba, out=None, work=None):
+    '''
+    [..., 4] rgba float array -> [..., 3] uint8 array with alpha applied.
+    per frame callers pass preallocated out (uint8) and work (float32) [..., 3] arrays to avoid allocating
+    '''
+    if work is None:
+        work = np.empty(rgba.shape[:-1] + (3,), dtype=np.float32)
+    np.multiply(rgba[..., :3], rgba[..., 3:], out=work)
+    np.divide(work, 255, out=work)
+    np.clip(work, 0, 255, out=work)
+    if out is None:
+        return work.astype(np.uint8)
+    np.copyto(out, work, casting="unsafe")
+    return out
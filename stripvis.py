@@ -4,50 +4,91 @@
 
 import pygame
 import sys
+import time
+import numpy as np
+from strip import premultiply
 
 class StripVisualizer:
-    def __init__(self, width: int, height: int, lights_obj):
+    """
+    Draws a frame buffer as one column per strip. lights_obj needs num_strips, strip_length
+    and a frame array of shape (num_strips, strip_length, 4) float rgba (Lights.frame) or
+    (num_strips, strip_length, 3) uint8 rgb (a decoded emulator frame).
+    The frame is uploaded to a strip_length tall surface with surfarray and scaled
+    to the window in one blit, at most max_fps times a second.
+    """
+    def __init__(self, width: int, height: int, lights_obj, max_fps: float = 30.0):
         pygame.init()
         self.width = width
         self.height = height
         self.lights_obj = lights_obj
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.last_draw = 0.0
 
         self.screen = pygame.display.set_mode((self.width * lights_obj.num_strips, self.height))
         pygame.display.set_caption("LED Strip Visualizer")
 
-        self.num_segments = lights_obj.num_strips * lights_obj.strip_length
-        self.seg_height = self.height / lights_obj.strip_length
+        # one pixel per led, surfarray indexes [x][y] so a strip is a column
+        self.leds = pygame.Surface((lights_obj.num_strips, lights_obj.strip_length))
+        self._work = np.empty((lights_obj.num_strips, lights_obj.strip_length, 3), dtype=np.float32)
+        self._rgb = np.empty((lights_obj.num_strips, lights_obj.strip_length, 3), dtype=np.uint8)
 
     def update(self):
         """
-        Redraws the screen by multiplying RGB values by the alpha fraction.
+        Redraws the screen with alpha multiplied into the RGB values, skipped if the last draw was too recent.
         """
+        now = time.perf_counter()
+        if now - self.last_draw < self.min_interval:
+            return
+        self.last_draw = now
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
 
-        self.screen.fill((0, 0, 0))  # Background for "off" pixels
-
-        for i, strip in enumerate(self.lights_obj.strips):
-            for j, (r, g, b, a) in enumerate(strip.strip):
-                # Calculate alpha fraction (0.0 to 1.0)
-                alpha_factor = a / 255.0
-
-                # Apply alpha to colors
-                display_color = (
-                    int(r * alpha_factor),
-                    int(g * alpha_factor),
-                    int(b * alpha_factor)
-                )
-
-                # Render the segment
-                rect = pygame.Rect(
-                    i * self.width,  # x position of the strip
-                    j * self.seg_height,  # y position of the segment
-                    self.width,  # width of the strip
-                    int(self.seg_height) + 1  # height of the segment
-                )
-                pygame.draw.rect(self.screen, display_color, rect)
-
-        pygame.display.flip()
\ No newline at end of file
+        frame = self.lights_obj.frame
+        if frame.shape[-1] == 4:
+            frame = premultiply(frame, self._rgb, self._work)
+
+        pygame.surfarray.blit_array(self.leds, frame)
+        pygame.transform.scale(self.leds, self.screen.get_size(), self.screen)
+        pygame.display.flip()
+
+class RingFrame:
+    """The latest frame of a FrameRing, copied out for StripVisualizer."""
+    def __init__(self, ring):
+        self.ring = ring
+        self.num_strips = ring.num_strips
+        self.strip_length = ring.strip_length
+        self.frame = np.zeros((ring.num_strips, ring.strip_length, 3), dtype=np.uint8)
+
+    def poll(self):
+        return self.ring.read(self.frame)
+
+def run_viewer(name=None, width=30, height=600, max_fps=30.0):
+    """
+    Show frames published to a shared memory FrameRing, meant to run in its own process.
+    """
+    from framering import FrameRing, RING_NAME
+    ring = FrameRing.attach(name or RING_NAME)
+    lights = RingFrame(ring)
+    visualizer = StripVisualizer(width, height, lights, max_fps=max_fps)
+    try:
+        while True:
+            lights.poll()
+            visualizer.update()
+            time.sleep(visualizer.min_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Attach a visualizer to frames published in shared memory")
+    parser.add_argument("--ring", help="ring name, e.g. udp-lights (main.py) or the emulator's --publish name")
+    parser.add_argument("--width", type=int, default=30, help="pixels per strip")
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--fps", type=float, default=30.0, help="max refresh rate")
+    args = parser.parse_args()
+    run_viewer(args.ring, args.width, args.height, args.fps)
@@ -0,0 +1,82 @@
+# Rolling timing histograms for every stage of the render loop
+#
+#   frame stages   color, effect, render (Lights.update), encode, send
+#   main loop      midi, launchpad, gui
+#   per fx         color:<name>, effect:<name>, time per strip
+# Any thread can record(), samples are kept for the last `window` calls of each stage.
+import time
+from collections import deque
+import numpy as np
+
+enabled = True # set False to skip timing in the hot paths
+window = 600 # samples kept per stage
+
+# histogram bucket upper edges in ms, the last bucket counts everything slower
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+
+class Histogram:
+    def __init__(self, window):
+        self.count = 0 # all time total
+        self._samples = deque(maxlen=window) # seconds
+
+    def add(self, dt):
+        self.count += 1
+        self._samples.append(dt)
+
+    def summary(self):
+        '''
+        avg / p50 / p95 / max in ms and bucket counts over the window
+        '''
+        ms = np.array(self._samples) * 1000
+        if not len(ms):
+            return {"count": self.count, "avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+        p50, p95 = np.percentile(ms, (50, 95))
+        buckets = np.bincount(np.searchsorted(BUCKETS, ms), minlength=len(BUCKETS) + 1)
+        return {"count": self.count, "avg": float(ms.mean()), "p50": float(p50), "p95": float(p95),
+                "max": float(ms.max()), "buckets": buckets.tolist()}
+
+_stages = {}
+
+def record(stage, dt):
+    '''
+    add a duration in seconds to a stage
+    '''
+    hist = _stages.get(stage)
+    if hist is None:
+        hist = _stages.setdefault(stage, Histogram(window))
+    hist.add(dt)
+
+class timed:
+    '''
+    with telemetry.timed("gui"): ... records the block's duration
+    '''
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if enabled:
+            record(self.stage, time.perf_counter() - self.start)
+
+def stats():
+    '''
+    {stage: summary} for every recorded stage
+    '''
+    return {stage: hist.summary() for stage, hist in list(_stages.items())}
+
+def reset():
+    _stages.clear()
+
+def report(top=5):
+    '''
+    one line of frame / loop stages plus the slowest fx by p95
+    '''
+    summaries = stats()
+    stages = [f"{stage} {s['avg']:.2f}/{s['p95']:.2f}ms" for stage, s in summaries.items() if ":" not in stage]
+    fx = sorted(((s["p95"], stage) for stage, s in summaries.items() if ":" in stage), reverse=True)[:top]
+    line = "avg/p95 " + " | ".join(stages)
+    if fx:
+        line += " || slowest " + ", ".join(f"{stage} {p95:.3f}ms" for p95, stage in fx)
+    return line
@@ -3,8 +3,13 @@
 #
 
 import socket
-import pygame
 import sys
+import time
+import argparse
+import threading
+import selectors
+from collections import deque
+import numpy as np
 
 # --- Configuration (Match these to your sender) ---
 IP = "0.0.0.0"  # Listen on all interfaces
@@ -13,111 +18,276 @@ STRIP_LENGTH = 70
 NUM_STRIPS = 3
 
 
-class StripVisualizer:
-    def __init__(self, width: int, height: int, lights_obj):
-        pygame.init()
-        self.width = width
-        self.height = height
-        self.lights_obj = lights_obj
+# WLED realtime protocols
+WARLS = 1
+DRGB = 2
+DRGBW = 3
+DNRGB = 4
 
-        self.screen = pygame.display.set_mode((self.width * lights_obj.num_strips, self.height))
-        pygame.display.set_caption("LED Strip Visualizer")
+# protocol byte -> (name, header bytes, bytes per led)
+#   WARLS  [1][timeout] [index, r, g, b]...     up to 255 leds
+#   DRGB   [2][timeout] [r, g, b]...            up to 490 leds
+#   DRGBW  [3][timeout] [r, g, b, w]...         up to 367 leds
+#   DNRGB  [4][timeout][start hi][start lo] [r, g, b]...
+PROTOCOLS = {
+    WARLS: ("WARLS", 2, 4),
+    DRGB: ("DRGB", 2, 3),
+    DRGBW: ("DRGBW", 2, 4),
+    DNRGB: ("DNRGB", 4, 3),
+}
+NO_TIMEOUT = 255  # timeout byte value that keeps the controller in realtime mode until told otherwise
 
-        self.num_segments = lights_obj.num_strips * lights_obj.strip_length
-        self.seg_height = self.height / lights_obj.strip_length
+# Linux reports datagrams the kernel dropped because the receive buffer was full
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40) if sys.platform.startswith("linux") else None
+FRAME_GAP = 0.002  # packets closer together than this (sec) are one frame burst from the sender
 
-    def update(self):
+
+class EmulatedController:
+    """
+    One WLED controller on its own UDP port. Packets are drained from a non-blocking
+    socket in batches and decoded straight into a NumPy (num_strips, strip_length, 3) frame.
+    WLED realtime packets carry no sequence number, so frames are the bursts the sender
+    emits, loss is what the kernel dropped on our socket, and reordering is a DNRGB
+    chunk arriving with a lower start index than the one before it in the same burst.
+    """
+    def __init__(self, port=PORT, num_strips=NUM_STRIPS, strip_length=STRIP_LENGTH, ip=IP, window=240):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        if SO_RXQ_OVFL is not None:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        self.sock.bind((ip, port))
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+
+        self.num_strips = num_strips
+        self.strip_length = strip_length
+        self.frame = np.zeros((num_strips, strip_length, 3), dtype=np.uint8)
+        self.pixels = self.frame.reshape(-1, 3)
+        self.white = np.zeros(len(self.pixels), dtype=np.uint8)  # white channel from DRGBW packets
+        self._buffer = bytearray(65536)
+        self._view = memoryview(self._buffer)
+        self._ancbufsize = socket.CMSG_SPACE(4) if SO_RXQ_OVFL is not None else 0
+
+        self.packets = 0
+        self.bytes = 0
+        self.frames = 0
+        self.dropped = 0    # datagrams dropped by the kernel before we read them, reported with the next packet after a drop
+        self.reordered = 0  # DNRGB chunks that arrived out of order within a frame
+        self.invalid = 0    # unknown protocol, truncated packets or a payload that isn't whole leds
+        self.overflow = 0   # packets addressing leds past the end of the frame, decoded up to the end
+        self.timeouts = 0   # times the realtime timeout ran out and the frame was cleared
+        self.protocols = {name: 0 for name, _, _ in PROTOCOLS.values()}
+        self.realtime_until = None  # perf_counter time the current realtime timeout runs out, None for never
+        self._intervals = deque(maxlen=window)  # seconds between frame starts
+        self._last_packet = None
+        self._last_frame = None
+        self._last_start = -1
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self, limit=256):
         """
-        Redraws the screen by multiplying RGB values by the alpha fraction.
+        Drain up to limit queued packets, returns how many were read.
         """
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-
-        self.screen.fill((0, 0, 0))  # Background for "off" pixels
-
-        for i, strip in enumerate(self.lights_obj.strips):
-            for j, (r, g, b, a) in enumerate(strip.strip):
-                # Calculate alpha fraction (0.0 to 1.0)
-                alpha_factor = a / 255.0
-
-                # Apply alpha to colors
-                display_color = (
-                    int(r * alpha_factor),
-                    int(g * alpha_factor),
-                    int(b * alpha_factor)
-                )
-
-                # Render the segment
-                rect = pygame.Rect(
-                    i * self.width,  # x position of the strip
-                    j * self.seg_height,  # y position of the segment
-                    self.width,  # width of the strip
-                    int(self.seg_height) + 1  # height of the segment
-                )
-                pygame.draw.rect(self.screen, display_color, rect)
-
-        pygame.display.flip()
-
-class RemoteLights:
-    """A dummy container to hold LED data for the visualizer."""
-    def __init__(self, strip_length, num_strips):
-        self.strip_length = strip_length
-        self.num_strips = num_strips
-        # The visualizer expects strip.strip to be [[r, g, b, a], ...]
-        self.strips = [RemoteStrip(strip_length) for _ in range(num_strips)]
+        count = 0
+        while count < limit:
+            try:
+                n, ancdata, flags, _ = self.sock.recvmsg_into([self._buffer], self._ancbufsize)
+            except (BlockingIOError, InterruptedError):
+                break
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL:
+                    self.dropped = int.from_bytes(data[:4], sys.byteorder)
+            if flags & socket.MSG_TRUNC:
+                self.invalid += 1
+            else:
+                self._packet(self._view[:n], time.perf_counter())
+            count += 1
+        return count
+
+    def _packet(self, data, arrival):
+        self.packets += 1
+        self.bytes += len(data)
+        if self._last_packet is None or arrival - self._last_packet > FRAME_GAP:
+            if self._last_frame is not None:
+                self._intervals.append(arrival - self._last_frame)
+            self._last_frame = arrival
+            self._last_start = -1
+            self.frames += 1
+        self._last_packet = arrival
 
-class RemoteStrip:
-    def __init__(self, length):
-        self.strip = [[0, 0, 0, 255] for _ in range(length)]
+        start = self.decode(data, arrival)
+        if start is None:
+            self.invalid += 1
+        elif start < self._last_start:
+            self.reordered += 1
+        else:
+            self._last_start = start
 
-def run_receiver():
-    # 1. Setup Networking
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((IP, PORT))
-    print(f"Listening for LED data on {IP}:{PORT}...")
+    def decode(self, data, arrival=None):
+        """
+        Write a packet's pixels into the frame, returns its start index or None if it can't be decoded.
+        """
+        spec = PROTOCOLS.get(data[0]) if len(data) else None
+        if spec is None:
+            return None
+        name, header, stride = spec
+        if len(data) < header or (len(data) - header) % stride:
+            return None
+        self.protocols[name] += 1
+        self._set_timeout(data[1], time.perf_counter() if arrival is None else arrival)
+
+        leds = np.frombuffer(data, dtype=np.uint8, offset=header).reshape(-1, stride)
+        if data[0] == WARLS:
+            valid = leds[:, 0] < len(self.pixels)
+            if not valid.all():
+                self.overflow += 1
+                leds = leds[valid]
+            self.pixels[leds[:, 0]] = leds[:, 1:]
+            self.white[leds[:, 0]] = 0
+            return 0
+
+        start = (data[2] << 8) | data[3] if data[0] == DNRGB else 0
+        count = len(leds)
+        if start + count > len(self.pixels):
+            self.overflow += 1
+            count = max(len(self.pixels) - start, 0)
+        self.pixels[start:start + count] = leds[:count, :3]
+        self.white[start:start + count] = leds[:count, 3] if stride == 4 else 0
+        return start
+
+    def _set_timeout(self, seconds, arrival):
+        self.realtime_until = None if seconds == NO_TIMEOUT else arrival + seconds
 
-    # 2. Setup Data and Visualizer
-    lights_data = RemoteLights(STRIP_LENGTH, NUM_STRIPS)
-    visualizer = StripVisualizer(width=50, height=800, lights_obj=lights_data)
+    def expire(self, now=None):
+        """
+        Leave realtime mode like WLED does once the sender's timeout has passed, clearing the frame.
+        """
+        if self.realtime_until is not None and (time.perf_counter() if now is None else now) >= self.realtime_until:
+            self.realtime_until = None
+            self.timeouts += 1
+            self.frame[...] = 0
+            self.white[...] = 0
+
+    def fps(self):
+        if not self._intervals:
+            return 0.0
+        return len(self._intervals) / sum(self._intervals)
 
+    def jitter(self):
+        """
+        (std dev, max deviation) of the frame interval in seconds
+        """
+        if len(self._intervals) < 2:
+            return 0.0, 0.0
+        intervals = np.array(self._intervals)
+        deviation = np.abs(intervals - intervals.mean())
+        return float(intervals.std()), float(deviation.max())
+
+    def stats(self):
+        std, worst = self.jitter()
+        return {"port": self.port, "fps": self.fps(), "frames": self.frames, "packets": self.packets,
+                "bytes": self.bytes, "dropped": self.dropped, "reordered": self.reordered,
+                "invalid": self.invalid, "overflow": self.overflow, "timeouts": self.timeouts,
+                "protocols": dict(self.protocols), "jitter_std": std, "jitter_max": worst}
+
+    def report(self):
+        st = self.stats()
+        return (f":{st['port']} fps {st['fps']:.1f} | {st['packets']} pkts {st['frames']} frames | dropped {st['dropped']}"
+                f" reordered {st['reordered']} invalid {st['invalid']} overflow {st['overflow']} timeouts {st['timeouts']} | jitter std {st['jitter_std'] * 1000:.2f}ms"
+                f" max {st['jitter_max'] * 1000:.2f}ms")
+
+    def close(self):
+        self.sock.close()
+
+
+class HeadlessEmulator:
+    """
+    Many EmulatedControllers in one process, received on a single background thread.
+    With publish set, every controller's decoded frame goes to a shared memory FrameRing
+    (named publish, or publish-<port> with several controllers) for stripvis viewers.
+    """
+    def __init__(self, ports=(PORT,), publish=None, **kwargs):
+        self.controllers = [EmulatedController(port, **kwargs) for port in ports]
+        self.rings = {}
+        if publish:
+            from framering import FrameRing
+            for controller in self.controllers:
+                name = publish if len(self.controllers) == 1 else f"{publish}-{controller.port}"
+                self.rings[controller] = FrameRing.create(controller.num_strips, controller.strip_length, name=name)
+        self._selector = selectors.DefaultSelector()
+        for controller in self.controllers:
+            self._selector.register(controller, selectors.EVENT_READ)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="wled-emulator", daemon=True)
+        self._thread.start()
+
+    @property
+    def packets(self):
+        return sum(controller.packets for controller in self.controllers)
+
+    def _run(self):
+        while self._running:
+            for key, _ in self._selector.select(timeout=0.1):
+                if key.fileobj.receive() and key.fileobj in self.rings:
+                    self.rings[key.fileobj].write(key.fileobj.frame)
+            now = time.perf_counter()
+            for controller in self.controllers:
+                controller.expire(now)
+
+    def report(self):
+        return "\n".join(controller.report() for controller in self.controllers)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._selector.close()
+        for controller in self.controllers:
+            controller.close()
+        for ring in self.rings.values():
+            ring.close()
+
+def run_headless(ports, num_strips=NUM_STRIPS, strip_length=STRIP_LENGTH, publish=None):
+    emulator = HeadlessEmulator(ports, publish=publish, num_strips=num_strips, strip_length=strip_length)
+    print(f"Emulating {len(ports)} controller(s) on {IP} ports {', '.join(map(str, ports))} (headless)...")
+    for ring in emulator.rings.values():
+        print(f"Publishing frames to shared memory {ring.name!r}, view with: python stripvis.py --ring {ring.name}")
     try:
         while True:
-            # 3. Receive Packet
-            data, addr = sock.recvfrom(4096) # Adjust buffer if strips are very long
-            
-            # 4. Parse Packet (Reverse of stripToBytes)
-            # Index 0: Mode (DRGB = 2)
-            # Index 1: Flags (Realtime = 10)
-            # Index 2+: R, G, B, R, G, B...
-            if len(data) > 2:
-                payload = data[2:]
-                
-                # Flattened list of all pixels across all strips
-                total_pixels = len(payload) // 3
-                
-                for p_idx in range(total_pixels):
-                    # Determine which strip and which LED this belongs to
-                    strip_idx = p_idx // STRIP_LENGTH
-                    led_idx = p_idx % STRIP_LENGTH
-                    
-                    if strip_idx < NUM_STRIPS:
-                        r = payload[p_idx * 3]
-                        g = payload[p_idx * 3 + 1]
-                        b = payload[p_idx * 3 + 2]
-                        # Update the data object the visualizer is watching
-                        # We keep Alpha at 255 because your sender only sends RGB
-                        lights_data.strips[strip_idx].strip[led_idx] = [r, g, b, 255]
-
-            # 5. Update Visualizer
-            visualizer.update()
+            time.sleep(1)
+            print(emulator.report())
+    except KeyboardInterrupt:
+        print("\nClosing receiver...")
+    finally:
+        emulator.close()
+
+def run_receiver(port=PORT, num_strips=NUM_STRIPS, strip_length=STRIP_LENGTH, max_fps=60.0):
+    from stripvis import StripVisualizer
 
+    # packets are received and decoded on the emulator thread, the window just shows the latest frame
+    emulator = HeadlessEmulator([port], num_strips=num_strips, strip_length=strip_length)
+    visualizer = StripVisualizer(width=50, height=800, lights_obj=emulator.controllers[0], max_fps=max_fps)
+    print(f"Listening for LED data on {IP}:{port}...")
+
+    try:
+        while True:
+            visualizer.update()
+            time.sleep(visualizer.min_interval)
     except KeyboardInterrupt:
         print("\nClosing receiver...")
     finally:
-        sock.close()
-        pygame.quit()
+        emulator.close()
 
 if __name__ == "__main__":
-    run_receiver()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Local WLED realtime UDP receiver")
+    parser.add_argument("--headless", action="store_true", help="decode and report stats without a pygame window")
+    parser.add_argument("--ports", type=int, nargs="+", default=[PORT], help="one emulated controller per port, the window shows the first")
+    parser.add_argument("--strips", type=int, default=NUM_STRIPS, help="strips per controller")
+    parser.add_argument("--length", type=int, default=STRIP_LENGTH, help="leds per strip")
+    parser.add_argument("--publish", metavar="NAME", help="publish decoded frames to shared memory for stripvis.py viewers (headless)")
+    args = parser.parse_args()
+    if args.headless:
+        run_headless(args.ports, args.strips, args.length, args.publish)
+    else:
+        run_receiver(args.ports[0], args.strips, args.length)
\ No newline at end of file